@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+Compare the speed of the GOFS longitude conversions with the previous loop/np.append versions on a 4500-point
+GOFS longitude axis. Run from the top level of the repository: python -m benchmarks.gofs_lon_conversion
+"""
+
+import timeit
+import numpy as np
+import functions.gofs as gofs
+
+
+def loop_convert_target_gofs_lon(target_lon):
+    target_convert = np.array([])
+    for tc in target_lon:
+        if tc < 0:
+            target_convert = np.append(target_convert, 360 + tc)
+        else:
+            target_convert = np.append(target_convert, tc)
+    return target_convert
+
+
+def loop_convert_gofs_target_lon(gofs_lon):
+    gofslon_convert = np.array([])
+    for gl in gofs_lon:
+        if gl > 180:
+            gofslon_convert = np.append(gofslon_convert, gl - 360)
+        else:
+            gofslon_convert = np.append(gofslon_convert, gl)
+    return gofslon_convert
+
+
+def main(npoints, repeats):
+    gofs_lon = np.linspace(0, 360, npoints, endpoint=False)  # GOFS 3.1 longitude axis
+    target_lon = gofs.convert_gofs_target_lon(gofs_lon)
+
+    tests = {'convert_gofs_target_lon': (loop_convert_gofs_target_lon, gofs.convert_gofs_target_lon, gofs_lon),
+             'convert_target_gofs_lon': (loop_convert_target_gofs_lon, gofs.convert_target_gofs_lon, target_lon)}
+
+    for name, (loopfunc, func, lon) in tests.items():
+        assert np.array_equal(loopfunc(lon), func(lon))
+        t_loop = min(timeit.repeat(lambda: loopfunc(lon), number=1, repeat=repeats))
+        t_vec = min(timeit.repeat(lambda: func(lon), number=1, repeat=repeats))
+        print('{}: loop {:.2f} ms, vectorized {:.3f} ms, {:.0f}x faster'.format(name, t_loop * 1000, t_vec * 1000,
+                                                                           t_loop / t_vec))
+
+
+if __name__ == '__main__':
+    n = 4500
+    nrepeats = 5
+    main(n, nrepeats)
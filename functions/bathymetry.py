@@ -0,0 +1,168 @@
+#! /usr/bin/env python3
+
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+"""
+import os
+import numpy as np
+import xarray as xr
+import functions.cache as cache
+
+
+def build_tile_store(bath_file, store_dir, factor=2, min_size=500, block_rows=1000):
+    """
+    Converts a bathymetry netcdf file (e.g. GEBCO) to a pyramid of memory-mapped .npy files. Level 0 is the full
+    resolution elevation, each following level keeps every factor-th point of the previous level, until a level is
+    smaller than min_size points on a side. The file is read in blocks of rows, so it is never loaded at once.
+    :param bath_file: bathymetry file with lat, lon and elevation variables
+    :param store_dir: output directory
+    :param factor: optional decimation factor between levels, default is 2
+    :param min_size: optional minimum number of points on a side of the coarsest level, default is 500
+    :param block_rows: optional number of rows read at once, default is 1000
+    """
+    ncbath = xr.open_dataset(bath_file)
+    lat = ncbath['lat'].values
+    lon = ncbath['lon'].values
+
+    level = 0
+    step = 1
+    prev = None
+    while True:
+        level_dir = os.path.join(store_dir, 'level{}'.format(level))
+        os.makedirs(level_dir, exist_ok=True)
+        np.save(os.path.join(level_dir, 'lat.npy'), lat[::step])
+        np.save(os.path.join(level_dir, 'lon.npy'), lon[::step])
+
+        nrows = len(lat[::step])
+        elev = np.lib.format.open_memmap(os.path.join(level_dir, 'elevation.npy'), mode='w+',
+                                         dtype=ncbath['elevation'].dtype, shape=(nrows, len(lon[::step])))
+        for i in range(0, nrows, block_rows):
+            if prev is None:
+                # level 0 is read from the file in contiguous blocks of rows
+                elev[i:i + block_rows] = ncbath['elevation'][i:i + block_rows].values
+            else:
+                # coarser levels are strided views of the previous level, no index arrays
+                elev[i:i + block_rows] = prev[i * factor:(i + block_rows) * factor:factor, ::factor]
+        elev.flush()
+        del prev
+        prev = elev
+
+        if np.minimum(len(lat[::step * factor]), len(lon[::step * factor])) < min_size:
+            break
+        level += 1
+        step *= factor
+    del prev
+    ncbath.close()
+
+    # write the level list last, an incomplete store is rebuilt
+    np.save(os.path.join(store_dir, 'levels.npy'), np.arange(level + 1))
+
+
+def return_tile_store(bath_file, store_dir=None, cache_dir=None):
+    """
+    Returns the tile store for a bathymetry file, building it the first time or when the bathymetry file is newer.
+    The store is saved next to the bathymetry file, or in the local cache if that directory is read-only.
+    :param bath_file: bathymetry netcdf file
+    :param store_dir: optional directory, default is the bathymetry file name with a _tiles extension
+    :param cache_dir: optional directory used when store_dir can't be written, default is cache.cache_dir/bathymetry
+    :return: tile store directory, or None if the store can't be saved anywhere
+    """
+    if not store_dir:
+        store_dir = '{}_tiles'.format(os.path.splitext(bath_file)[0])
+    if not cache_dir:
+        cache_dir = os.path.join(cache.cache_dir, 'bathymetry')
+    store_dirs = [store_dir, os.path.join(cache_dir, os.path.basename(store_dir))]
+
+    for sd in store_dirs:
+        levels_file = os.path.join(sd, 'levels.npy')
+        if os.path.isfile(levels_file) and os.path.getmtime(levels_file) >= os.path.getmtime(bath_file):
+            return sd
+
+    for sd in store_dirs:
+        try:
+            print('\nBuilding bathymetry tile store: {}'.format(sd))
+            build_tile_store(bath_file, sd)
+            return sd
+        except OSError:
+            print('Unable to save bathymetry tile store: {}'.format(sd))
+
+    return None
+
+
+def select_level(store_dir, extent, npoints):
+    """
+    Selects the coarsest level that still has at least npoints across the extent
+    :param store_dir: tile store directory
+    :param extent: [min lon, max lon, min lat, max lat]
+    :param npoints: number of points needed across the extent, e.g. the figure width in pixels
+    :return: level number
+    """
+    levels = np.load(os.path.join(store_dir, 'levels.npy'))
+    for level in levels[::-1]:
+        lon = np.load(os.path.join(store_dir, 'level{}'.format(level), 'lon.npy'))
+        if np.sum(np.logical_and(lon >= extent[0], lon <= extent[1])) >= npoints:
+            return level
+
+    return levels[0]
+
+
+def read_bathymetry(bath_file, extent, npoints=None):
+    """
+    Reads the bathymetry in an extent directly from the bathymetry file, used when there isn't a tile store. Every
+    n-th point is kept so there are about npoints across the extent.
+    :param bath_file: bathymetry netcdf file
+    :param extent: [min lon, max lon, min lat, max lat]
+    :param npoints: optional number of points needed across the extent, default is the full resolution
+    :return: lon, lat and elevation arrays
+    """
+    with xr.open_dataset(bath_file) as ncbath:
+        lat = ncbath['lat'].values
+        lon = ncbath['lon'].values
+        lat_idx = np.flatnonzero(np.logical_and(lat >= extent[2], lat <= extent[3]))
+        lon_idx = np.flatnonzero(np.logical_and(lon >= extent[0], lon <= extent[1]))
+        if len(lat_idx) == 0 or len(lon_idx) == 0:
+            return np.array([]), np.array([]), np.empty((0, 0))
+
+        step = max(len(lon_idx) // npoints, 1) if npoints else 1
+        lat_slice = slice(lat_idx[0], lat_idx[-1] + 1, step)
+        lon_slice = slice(lon_idx[0], lon_idx[-1] + 1, step)
+        elev = ncbath['elevation'][lat_slice, lon_slice].values
+
+    return lon[lon_slice], lat[lat_slice], elev
+
+
+def return_bathymetry(bath_file, extent, npoints=None):
+    """
+    Returns the bathymetry in an extent, only reading that part of the tile store (or of the bathymetry file if the
+    tile store can't be saved)
+    :param bath_file: bathymetry netcdf file
+    :param extent: [min lon, max lon, min lat, max lat]
+    :param npoints: optional number of points needed across the extent (e.g. figure width in inches * dpi),
+    default is the full resolution
+    :return: lon, lat and elevation arrays
+    """
+    store_dir = return_tile_store(bath_file)
+    if store_dir is None:
+        return read_bathymetry(bath_file, extent, npoints)
+
+    if npoints:
+        level = select_level(store_dir, extent, npoints)
+    else:
+        level = 0
+
+    level_dir = os.path.join(store_dir, 'level{}'.format(level))
+    lat = np.load(os.path.join(level_dir, 'lat.npy'))
+    lon = np.load(os.path.join(level_dir, 'lon.npy'))
+    elev = np.load(os.path.join(level_dir, 'elevation.npy'), mmap_mode='r')
+
+    # lat and lon are sorted, so the extent is a contiguous window of the memory-mapped elevation
+    lat_idx = np.flatnonzero(np.logical_and(lat >= extent[2], lat <= extent[3]))
+    lon_idx = np.flatnonzero(np.logical_and(lon >= extent[0], lon <= extent[1]))
+    if len(lat_idx) == 0 or len(lon_idx) == 0:
+        return np.array([]), np.array([]), np.empty((0, 0))
+
+    lat_slice = slice(lat_idx[0], lat_idx[-1] + 1)
+    lon_slice = slice(lon_idx[0], lon_idx[-1] + 1)
+
+    return lon[lon_slice], lat[lat_slice], np.array(elev[lat_slice, lon_slice])
@@ -0,0 +1,133 @@
+#! /usr/bin/env python3
+
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+"""
+import numpy as np
+
+
+def level_bin_edges(levels):
+    """
+    Returns depth bin edges centered on model depth levels (halfway between levels)
+    :param levels: array of model depths, e.g. GOFS depth or RTOFS Depth
+    :return: array of bin edges with length len(levels) + 1
+    """
+    levels = np.asarray(levels, dtype=float)
+    mid = (levels[1:] + levels[:-1]) / 2
+    return np.concatenate(([levels[0] - (mid[0] - levels[0])], mid, [levels[-1] + (levels[-1] - mid[-1])]))
+
+
+def uniform_bin_edges(max_depth, bin_size=1):
+    """
+    Returns evenly spaced depth bin edges from the surface to max_depth
+    :param max_depth: maximum depth (m)
+    :param bin_size: optional bin size (m), default is 1
+    :return: array of bin edges
+    """
+    return np.arange(0, max_depth + bin_size, bin_size)
+
+
+def profile_numbers(profiles, nrows):
+    """
+    Returns the profile number for every row of glider data
+    :param profiles: profile index from gliders.build_profile_index
+    :param nrows: number of rows in the glider data
+    :return: array of profile numbers (row number in profiles), -1 for rows that aren't in a profile
+    """
+    starts = profiles['row_offset'].values.astype(int)
+    lengths = profiles['row_length'].values.astype(int)
+    rows = np.arange(np.sum(lengths)) + np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    numbers = np.full(nrows, -1)
+    numbers[rows] = np.repeat(np.arange(len(profiles)), lengths)
+    return numbers
+
+
+def bin_profiles(profile, depth, values, edges, nprofiles, stat='mean'):
+    """
+    Bins data from many profiles into depth bins in one pass, ignoring nans
+    :param profile: array of profile numbers (0 to nprofiles - 1, -1 to skip) for each value, e.g. from
+    profile_numbers
+    :param depth: array of depths for each value
+    :param values: array of values to bin
+    :param edges: array of depth bin edges, e.g. from level_bin_edges or uniform_bin_edges
+    :param nprofiles: number of profiles
+    :param stat: optional statistic calculated in each bin: 'mean' or 'median', default is 'mean'
+    :return: binned values and the number of values in each bin, both with shape (nprofiles, number of bins)
+    """
+    profile = np.asarray(profile)
+    depth = np.asarray(depth, dtype=float)
+    values = np.asarray(values, dtype=float)
+    nbins = len(edges) - 1
+
+    b = np.searchsorted(edges, depth, side='right') - 1
+    ok = np.logical_and.reduce((~np.isnan(values), ~np.isnan(depth), profile >= 0, profile < nprofiles, b >= 0,
+                                b < nbins))
+    key = profile[ok] * nbins + b[ok]
+    values = values[ok]
+
+    counts = np.bincount(key, minlength=nprofiles * nbins)
+    binned = np.full(nprofiles * nbins, np.nan)
+    filled = counts > 0
+    if stat == 'mean':
+        sums = np.bincount(key, weights=values, minlength=nprofiles * nbins)
+        binned[filled] = sums[filled] / counts[filled]
+    elif stat == 'median':
+        # sort the values in each bin, then take the middle value(s)
+        order = np.lexsort((values, key))
+        values = values[order]
+        start = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        c = counts[filled]
+        binned[filled] = (values[start + (c - 1) // 2] + values[start + c // 2]) / 2
+    else:
+        raise ValueError('Unknown statistic: {}'.format(stat))
+
+    return binned.reshape(nprofiles, nbins), counts.reshape(nprofiles, nbins)
+
+
+def interp_profiles(profile, depth, values, target_depth, nprofiles):
+    """
+    Linearly interpolates data from many profiles to target depths in one pass. Values aren't extrapolated above
+    or below the data in a profile.
+    :param profile: array of profile numbers (0 to nprofiles - 1, -1 to skip) for each value
+    :param depth: array of depths for each value
+    :param values: array of values to interpolate
+    :param target_depth: array of target depths, e.g. model depth levels
+    :param nprofiles: number of profiles
+    :return: interpolated values with shape (nprofiles, len(target_depth))
+    """
+    profile = np.asarray(profile)
+    depth = np.asarray(depth, dtype=float)
+    values = np.asarray(values, dtype=float)
+    target_depth = np.asarray(target_depth, dtype=float)
+
+    ok = np.logical_and.reduce((~np.isnan(values), ~np.isnan(depth), profile >= 0, profile < nprofiles))
+    result = np.full((nprofiles, len(target_depth)), np.nan)
+    if np.sum(ok) == 0:
+        return result
+
+    # sort all of the data by profile then depth using one key, so every profile/target pair is found with one
+    # binary search
+    d0 = np.min(depth[ok])
+    span = np.max(depth[ok]) - d0 + 1
+    key = profile[ok] * span + depth[ok] - d0
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    p = profile[ok][order]
+    v = values[ok][order]
+
+    target_profile = np.repeat(np.arange(nprofiles)[:, np.newaxis], len(target_depth), axis=1)
+    target_key = target_profile * span + target_depth[np.newaxis, :] - d0
+    hi = np.clip(np.searchsorted(key, target_key), 0, len(key) - 1)
+    lo = np.clip(hi - 1, 0, len(key) - 1)
+
+    exact = key[hi] == target_key
+    between = np.logical_and.reduce((p[lo] == target_profile, p[hi] == target_profile, key[lo] < target_key,
+                                     key[hi] > target_key))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = (target_key - key[lo]) / (key[hi] - key[lo])
+    result[between] = (v[lo] + w * (v[hi] - v[lo]))[between]
+    exact = np.logical_and(exact, p[hi] == target_profile)
+    result[exact] = v[hi][exact]
+
+    return result
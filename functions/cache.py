@@ -0,0 +1,127 @@
+#! /usr/bin/env python3
+
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+"""
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+import xarray as xr
+
+# local cache for model subsets, override the location with the HURRICANE_GLIDERS_CACHE environment variable
+cache_dir = os.environ.get('HURRICANE_GLIDERS_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'hurricane-gliders'))
+max_cache_size = 5 * 1024 ** 3  # bytes, least recently used files are removed when the cache is larger than this
+max_subset_size = 256 * 1024 ** 2  # bytes, larger subsets aren't cached so they stay lazy
+
+
+def cache_key(varname, start_time, end_time, coordlims, depth_range=None, kind=None, url=None):
+    """
+    Returns a unique key for a model subset
+    :param varname: variable name
+    :param start_time: start time (datetime)
+    :param end_time: end time (datetime)
+    :param coordlims: [lon min, lon max, lat min, lat max]
+    :param depth_range: optional [depth min, depth max]
+    :param kind: optional kind of subset, e.g. the name of the function that made it (gridded, point, transect)
+    :param url: optional url of the model dataset the subset was taken from
+    :return: hash string
+    """
+    if depth_range is not None:
+        depth_range = [float(d) for d in depth_range]
+    key = [kind, url, varname, start_time.strftime('%Y%m%dT%H%M%S'), end_time.strftime('%Y%m%dT%H%M%S'),
+           [float(np.round(c, 6)) for c in coordlims], depth_range]
+
+    return hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+
+
+def cache_file(key, model='GOFS'):
+    return os.path.join(cache_dir, model, '{}.nc'.format(key))
+
+
+def load(key, model='GOFS'):
+    """
+    Returns a cached model subset, or None if the subset isn't in the cache
+    :param key: key returned by cache_key
+    :param model: model (e.g. GOFS)
+    :return: xarray DataArray or None
+    """
+    fname = cache_file(key, model)
+    if not os.path.isfile(fname):
+        return None
+
+    os.utime(fname)  # mark the file as recently used
+    with xr.open_dataarray(fname, decode_times=False) as da:
+        da = da.load()
+
+    return da
+
+
+def store(key, da, model='GOFS'):
+    """
+    Saves a model subset to the cache and removes the least recently used files if the cache is too large. Subsets
+    larger than max_subset_size aren't cached, they are returned without being loaded.
+    :param key: key returned by cache_key
+    :param da: xarray DataArray
+    :param model: model (e.g. GOFS)
+    :return: the loaded xarray DataArray, or da if it is too large to cache
+    """
+    if da.nbytes > max_subset_size:
+        return da
+
+    da = da.load()
+    out = da.copy()
+    out.encoding = {}
+    for c in out.coords:
+        out[c].encoding = {}
+
+    fname = cache_file(key, model)
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+
+    # a unique temporary file for each writer, so an interrupted write never leaves a partial file in the cache and
+    # processes writing the same subset don't clobber each other
+    fd, tmpfile = tempfile.mkstemp(dir=os.path.dirname(fname), suffix='.tmp')
+    os.close(fd)
+    try:
+        out.to_netcdf(tmpfile)
+        os.replace(tmpfile, fname)
+    except (OSError, RuntimeError):
+        if os.path.isfile(tmpfile):
+            os.remove(tmpfile)
+        raise
+    evict()
+
+    return da
+
+
+def evict(max_size=None):
+    """
+    Removes the least recently used files until the cache is smaller than max_size
+    :param max_size: optional maximum cache size in bytes, default is max_cache_size
+    """
+    if max_size is None:
+        max_size = max_cache_size
+
+    files = []
+    for root, dirs, fnames in os.walk(cache_dir):
+        for f in fnames:
+            if f.endswith('.nc'):
+                fpath = os.path.join(root, f)
+                try:
+                    fstat = os.stat(fpath)
+                except FileNotFoundError:  # removed by another process
+                    continue
+                files.append((fstat.st_mtime, fstat.st_size, fpath))
+
+    total = np.sum([f[1] for f in files])
+    for mtime, size, fpath in sorted(files):
+        if total <= max_size:
+            break
+        try:
+            os.remove(fpath)
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -0,0 +1,112 @@
+#! /usr/bin/env python3
+
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+"""
+import numpy as np
+import xarray as xr
+import functions.composites as composites
+
+
+def passage_times(track_times, track_lons, track_lats, target_lons, target_lats):
+    """
+    Returns the time the storm passed each point (e.g. of a densified track from common.return_target_transect).
+    Each point is projected onto the nearest segment of the track, and the time is interpolated within that segment.
+    :param track_times: array of track times (datetime)
+    :param track_lons: array of track longitudes
+    :param track_lats: array of track latitudes
+    :param target_lons: array of longitudes
+    :param target_lats: array of latitudes
+    :return: array of passage times (datetime64)
+    """
+    track_times = np.array(track_times, dtype='datetime64[ns]')
+    t0 = track_times[0]
+    seconds = (track_times - t0) / np.timedelta64(1, 's')
+    target_lats = np.asarray(target_lats, dtype=float)
+    if len(track_times) == 1:
+        return np.full(len(target_lats), t0)
+
+    # positions in degrees latitude, with longitudes scaled at the middle of the track
+    scale = np.cos(np.deg2rad(np.nanmean(track_lats)))
+    tx = np.asarray(track_lons, dtype=float) * scale
+    ty = np.asarray(track_lats, dtype=float)
+    px = np.asarray(target_lons, dtype=float)[:, np.newaxis] * scale
+    py = target_lats[:, np.newaxis]
+
+    # fraction along every segment (point, segment) of the closest point on the segment
+    sx = np.diff(tx)
+    sy = np.diff(ty)
+    length2 = sx ** 2 + sy ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        f = ((px - tx[:-1]) * sx + (py - ty[:-1]) * sy) / length2
+    f = np.clip(np.where(length2 > 0, f, 0), 0, 1)
+    dist2 = (px - tx[:-1] - f * sx) ** 2 + (py - ty[:-1] - f * sy) ** 2
+
+    seg = np.argmin(dist2, axis=1)
+    frac = f[np.arange(len(seg)), seg]
+    target_seconds = seconds[seg] + frac * (seconds[seg + 1] - seconds[seg])
+
+    return t0 + np.round(target_seconds * 1e9).astype('timedelta64[ns]')
+
+
+def cold_wake(da, coordnames, pass_times, lons, lats, lags=None, reference_lag=None):
+    """
+    Calculates the change in a model field (e.g. SST or OHC) at every point along a storm track at lag times
+    relative to when the storm passed the point. The model times and area needed for all points and lags are read
+    at once, then all of the values are gathered together.
+    :param da: xarray DataArray of a 2D field with time, latitude and longitude dimensions on a regular grid
+    :param coordnames: dictionary containing names of dimensions with keys: time, lat, lon
+    :param pass_times: array of storm passage times for each point, e.g. from passage_times
+    :param lons: array of longitudes, in the same convention as the model (e.g. convert to GOFS longitudes with
+    gofs.convert_target_gofs_lon)
+    :param lats: array of latitudes
+    :param lags: optional list of lags (days) relative to storm passage, default is -1 to 5 days
+    :param reference_lag: optional lag (days) that changes are calculated from, default is the first lag
+    :return: xarray dataset with the field value and the difference from the reference lag, with dimensions
+    (point, lag)
+    """
+    if lags is None:
+        lags = np.arange(-1, 6)
+    lags = np.asarray(lags, dtype=float)
+    if reference_lag is None:
+        reference_lag = lags[0]
+    pass_times = np.array(pass_times, dtype='datetime64[ns]')
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    da = da.sortby([coordnames['lat'], coordnames['lon']])
+
+    # model time nearest to every point and lag
+    lag_times = pass_times[:, np.newaxis] + (lags * 86400 * 1e9).astype('timedelta64[ns]')
+    times = composites.model_times(da[coordnames['time']])
+    time_idx = composites.nearest_time_index(times, lag_times.ravel())
+    read_idx = np.unique(time_idx[time_idx >= 0])
+
+    grid_lats = da[coordnames['lat']].values
+    grid_lons = da[coordnames['lon']].values
+    lat_idx = np.flatnonzero(np.logical_and(grid_lats >= np.nanmin(lats) - 1, grid_lats <= np.nanmax(lats) + 1))
+    lon_idx = np.flatnonzero(np.logical_and(grid_lons >= np.nanmin(lons) - 1, grid_lons <= np.nanmax(lons) + 1))
+
+    point_lons = np.repeat(lons, len(lags))[:, np.newaxis, np.newaxis]
+    point_lats = np.repeat(lats, len(lags))[:, np.newaxis, np.newaxis]
+    if len(read_idx) == 0 or len(lat_idx) == 0 or len(lon_idx) == 0:
+        values = np.full((len(lons), len(lags)), np.nan)
+    else:
+        lat_slice = slice(lat_idx[0], lat_idx[-1] + 1)
+        lon_slice = slice(lon_idx[0], lon_idx[-1] + 1)
+        field = da.isel({coordnames['time']: read_idx, coordnames['lat']: lat_slice,
+                         coordnames['lon']: lon_slice}).transpose(coordnames['time'], coordnames['lat'],
+                                                                  coordnames['lon']).values
+        time_idx = np.where(time_idx >= 0, np.searchsorted(read_idx, time_idx), -1)
+        values = composites.sample_fields(field, grid_lons[lon_slice], grid_lats[lat_slice], time_idx, point_lons,
+                                          point_lats).reshape(len(lons), len(lags))
+
+    ref = values[:, np.argmin(abs(lags - reference_lag))]
+    dims = ('point', 'lag')
+    wake = xr.Dataset(dict(value=(dims, values), difference=(dims, values - ref[:, np.newaxis])),
+                      coords=dict(lag=lags, passage_time=('point', pass_times), lon=('point', lons),
+                                  lat=('point', lats)))
+    wake['lag'].attrs['units'] = 'days'
+    wake.attrs['reference_lag'] = float(reference_lag)
+
+    return wake
@@ -2,7 +2,7 @@
 
 """
 Author: Lori Garzio on 2/19/2021
-Last modified: 4/15/2021
+Last modified: 10/17/2026
 """
 import numpy as np
 import xarray as xr
@@ -29,20 +29,104 @@ def ohc_surface_2d(temp, depth):
     :param depth: 1D array of corresponding depths
     """
     print('\nCalculating OHC')
-    cp = 3985  # Heat capacity of salt water in J/(kg K)
+    ohc = ohc_integrate(np.asarray(temp, dtype=float), depth, axis=-1, inclusive=True)
+
+    return ohc
+
+
+def ohc_transects(temp, depth):
+    """
+    Calculate ocean heat content integrated to the 26C isotherm and the depth of the 26C isotherm for every
+    position of one or many transects at once. Columns whose warm pool doesn't reach 10 m or shallower are nan,
+    the same as ohc_surface_2d.
+    :param temp: array of seawater temperature with depth along the last axis, e.g. (position, depth) or
+    (time, position, depth)
+    :param depth: 1D array of corresponding depths
+    :return: arrays of OHC (KJ/cm2) and 26C isotherm depth (m) with the depth axis removed
+    """
+    temp = np.asarray(temp, dtype=float)
+    ohc = ohc_integrate(temp, depth, axis=-1, inclusive=True)
+    d26 = isotherm_depth(temp, depth, axis=-1)
+
+    return ohc, d26
+
+
+def nearest_index(values, targets):
+    """
+    Finds the nearest value of a sorted 1D axis for many targets with a binary search, without a (values, targets)
+    distance matrix
+    :param values: 1D array sorted in increasing order, e.g. model times, latitudes or longitudes
+    :param targets: array of target values
+    :return: array of indices of the nearest values
+    """
+    values = np.asarray(values)
+    targets = np.asarray(targets)
+    if len(values) == 1:
+        return np.zeros(targets.shape, dtype=int)
+    hi = np.clip(np.searchsorted(values, targets), 1, len(values) - 1)
+    lo = hi - 1
+    return np.where(targets - values[lo] <= values[hi] - targets, lo, hi)
+
+
+def gather_columns(da, y_idx, x_idx, ydim, xdim):
+    """
+    Extract the columns of a gridded variable at many grid points with a single read of the smallest box that
+    contains all of the points, followed by local gathering. For remote (OPeNDAP) datasets this is one request per
+    variable instead of one request per point.
+    :param da: xarray DataArray with ydim and xdim as dims
+    :param y_idx: array of grid indices along ydim
+    :param x_idx: array of grid indices along xdim
+    :param ydim: name of the y dimension (e.g. lat, Y)
+    :param xdim: name of the x dimension (e.g. lon, X)
+    :return: numpy array with the remaining dims followed by a position dimension with length len(y_idx)
+    """
+    y_idx = np.asarray(y_idx, dtype=int)
+    x_idx = np.asarray(x_idx, dtype=int)
+    y0 = np.min(y_idx)
+    x0 = np.min(x_idx)
+    box = da.isel({ydim: slice(y0, np.max(y_idx) + 1), xdim: slice(x0, np.max(x_idx) + 1)})
+    box = box.transpose(..., ydim, xdim).values
+
+    return box[..., y_idx - y0, x_idx - x0]
+
+
+def ohc_integrate(temp, depth, axis=0, warm_pool_depth=10, inclusive=False):
+    """
+    Vectorized calculation of ocean heat content integrated to the 26C isotherm for every column of an array.
+    The trapezoid weights are masked to the values >= 26C, so each column is integrated over exactly the points
+    np.trapz sees when it is given temp[temp >= 26] and depth[temp >= 26].
+    :param temp: array of seawater temperature with depth along axis (e.g. depth, lat, lon)
+    :param depth: 1D array of depths corresponding to axis
+    :param axis: optional depth axis of temp, default is 0
+    :param warm_pool_depth: optional depth (m) the warm pool must reach above, otherwise OHC is nan. Default is 10
+    :param inclusive: optional, True keeps warm pools that start exactly at warm_pool_depth, default is False
+    :return: array of OHC (KJ/cm2) with the depth axis removed
+    """
+    cp = 3985  # Heat capacity in J/(kg K)
     rho0 = 1025
-    ohc = np.array([])
-    for i in range(len(temp)):
-        tempi = temp[i]
-        ok26 = tempi >= 26
-        if np.sum(ok26) > 0:
-            if np.nanmin(depth[ok26]) > 10:    # if the warm pool isn't at the surface, skip
-                ohc = np.append(ohc, np.nan)
-            else:
-                hc = cp * rho0 * np.trapz(tempi[ok26] - 26, depth[ok26]) * 10 ** -7  # KJ/cm2
-                ohc = np.append(ohc, hc)
-        else:
-            ohc = np.append(ohc, np.nan)
+    temp = np.moveaxis(np.asarray(temp, dtype=float), axis, -1)
+    depth = np.broadcast_to(np.asarray(depth, dtype=float), temp.shape)
+    ok26 = temp >= 26
+
+    # shallowest depth of the warm pool in each column
+    top = np.min(np.where(ok26, depth, np.inf), axis=-1)
+    if inclusive:
+        surface = top <= warm_pool_depth
+    else:
+        surface = top < warm_pool_depth
+
+    # index of the previous value >= 26C in each column, -1 if there isn't one
+    levels = np.where(ok26, np.arange(temp.shape[-1]), -1)
+    prev = np.maximum.accumulate(levels, axis=-1)
+    prev = np.concatenate((np.full(prev.shape[:-1] + (1,), -1), prev[..., :-1]), axis=-1)
+    segment = np.logical_and(ok26, prev > -1)
+    prev[prev < 0] = 0
+
+    temp_prev = np.take_along_axis(temp, prev, axis=-1)
+    depth_prev = np.take_along_axis(depth, prev, axis=-1)
+    trap = np.where(segment, (depth - depth_prev) * (temp - 26 + temp_prev - 26) / 2, 0)
+    ohc = cp * rho0 * np.sum(trap, axis=-1) * 10 ** -7  # KJ/cm2
+    ohc = np.where(surface, ohc, np.nan)
 
     return ohc
 
@@ -55,32 +139,107 @@ def ohc_surface_3d(temp, coordnames, model):
     :param model: model (e.g. GOFS, RTOFS)
     """
     print('\nCalculating OHC')
-    cp = 3985  # Heat capacity in J/(kg K)
-    rho0 = 1025
     if model == 'GOFS':
-        ohc = np.empty((len(temp[coordnames['lat']]), len(temp[coordnames['lon']])))
-    else:
-        ohc = np.empty(np.shape(temp[coordnames['lat']]))
-    ohc[:] = np.nan
-    lats = np.array([])
-    lons = np.array([])
-    for i, j in enumerate(ohc):
-        for ii, jj in enumerate(j):
-            tempi = temp[:, i, ii]
-            if i == 0:
-                lons = np.append(lons, tempi[coordnames['lon']].values)
-            if ii == 0:
-                lats = np.append(lats, tempi[coordnames['lat']].values)
-            ok26 = tempi >= 26
-            if np.sum(ok26) > 0:
-                if np.nanmin(tempi[coordnames['depth']][ok26]) < 10:  # if the warm pool is at the surface
-                    hc = cp * rho0 * np.trapz(tempi[ok26] - 26, tempi[coordnames['depth']][ok26]) * 10 ** -7  # KJ/cm2
-                    ohc[i, ii] = hc
+        lats = temp[coordnames['lat']].values
+        lons = temp[coordnames['lon']].values
+    else:  # RTOFS latitude and longitude are 2D
+        lats = temp[coordnames['lat']].values[:, 0]
+        lons = temp[coordnames['lon']].values[0, :]
+
+    ohc = ohc_integrate(temp.values, temp[coordnames['depth']].values, axis=temp.get_axis_num(coordnames['depth']))
 
     ohc_ds = xr.DataArray(ohc, coords=[lats, lons], dims=[coordnames['lat'], coordnames['lon']])
     return ohc_ds
 
 
+def isotherm_depth(temp, depth, axis=0, isotherm=26):
+    """
+    Vectorized calculation of the depth of an isotherm for every column of an array. The depth is linearly
+    interpolated between the levels where temperature first drops below the isotherm.
+    :param temp: array of seawater temperature with depth along axis (e.g. depth, lat, lon)
+    :param depth: 1D array of depths corresponding to axis
+    :param axis: optional depth axis of temp, default is 0
+    :param isotherm: optional isotherm (degrees C), default is 26
+    :return: array of isotherm depths (m) with the depth axis removed, nan where there is no crossing
+    """
+    temp = np.moveaxis(np.asarray(temp, dtype=float), axis, -1)
+    depth = np.broadcast_to(np.asarray(depth, dtype=float), temp.shape)
+    crossing = np.logical_and(temp[..., :-1] >= isotherm, temp[..., 1:] < isotherm)
+    k = np.expand_dims(np.argmax(crossing, axis=-1), axis=-1)
+
+    t0 = np.take_along_axis(temp, k, axis=-1)[..., 0]
+    t1 = np.take_along_axis(temp, k + 1, axis=-1)[..., 0]
+    d0 = np.take_along_axis(depth, k, axis=-1)[..., 0]
+    d1 = np.take_along_axis(depth, k + 1, axis=-1)[..., 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        d = d0 + (isotherm - t0) * (d1 - d0) / (t1 - t0)
+    d = np.where(np.any(crossing, axis=-1), d, np.nan)
+
+    return d
+
+
+def mld_temperature(temp, depth, axis=0, ref_depth=10, threshold=0.2):
+    """
+    Vectorized calculation of mixed layer depth for every column of an array using a temperature criterion: the
+    first depth below the reference depth where temperature differs from the temperature at the reference depth by
+    more than the threshold
+    :param temp: array of seawater temperature with depth along axis
+    :param depth: 1D array of depths corresponding to axis
+    :param axis: optional depth axis of temp, default is 0
+    :param ref_depth: optional reference depth (m), default is 10
+    :param threshold: optional temperature threshold (degrees C), default is 0.2
+    :return: array of mixed layer depths (m) with the depth axis removed
+    """
+    temp = np.moveaxis(np.asarray(temp, dtype=float), axis, -1)
+    depth = np.asarray(depth, dtype=float)
+    kref = np.argmin(abs(depth - ref_depth))
+    tref = temp[..., kref:kref + 1]
+
+    with np.errstate(invalid='ignore'):
+        exceed = abs(temp - tref) > threshold
+    exceed[..., 0:kref + 1] = False
+    mld = depth[np.argmax(exceed, axis=-1)]
+    mld = np.where(np.logical_and(np.any(exceed, axis=-1), ~np.isnan(tref[..., 0])), mld, np.nan)
+
+    return mld
+
+
+def derived_fields_timeseries(ds, varnames, coordnames, chunks=None):
+    """
+    Lazily calculate OHC, density and the 26C isotherm depth for a model dataset with multiple times. The
+    calculations are split into dask chunks (one time step by default, depth is always kept in a single chunk) and
+    nothing is computed until the output is loaded or written, e.g. with .compute() or .to_netcdf(), so memory use
+    is limited by the chunk size and the chunks are computed in parallel.
+    :param ds: xarray dataset of seawater temperature and salinity with time, depth, latitude and longitude dims
+    :param varnames: dictionary containing names of variables with keys: temp, salt
+    :param coordnames: dictionary containing names of dimensions with keys: time, depth
+    :param chunks: optional dictionary of chunk sizes for the time and horizontal dimensions,
+    e.g. {'time': 4, 'lat': 200, 'lon': 200}. Default is {time: 1}
+    :return: lazy xarray dataset containing ohc (KJ/cm2), density (kg/m3) and d26 (m)
+    """
+    if not chunks:
+        chunks = {coordnames['time']: 1}
+    chunks = dict(chunks)
+    chunks[coordnames['depth']] = -1  # each chunk needs the full water column
+    ds = ds[[varnames['temp'], varnames['salt']]].chunk(chunks)
+    temp = ds[varnames['temp']]
+    salt = ds[varnames['salt']]
+    depth = ds[coordnames['depth']]
+
+    ohc = xr.apply_ufunc(ohc_integrate, temp, depth, input_core_dims=[[coordnames['depth']], [coordnames['depth']]],
+                         kwargs={'axis': -1}, dask='parallelized', output_dtypes=[float])
+    d26 = xr.apply_ufunc(isotherm_depth, temp, depth, input_core_dims=[[coordnames['depth']], [coordnames['depth']]],
+                         kwargs={'axis': -1}, dask='parallelized', output_dtypes=[float])
+    density = xr.apply_ufunc(sw.dens, salt, temp, depth, dask='parallelized', output_dtypes=[float])
+
+    derived = xr.Dataset(dict(ohc=ohc, density=density.transpose(*temp.dims), d26=d26))
+    derived['ohc'].attrs['units'] = 'KJ/cm2'
+    derived['density'].attrs['units'] = 'kg/m3'
+    derived['d26'].attrs['units'] = 'm'
+
+    return derived
+
+
 # def ohc_surface(temp):
 #     """
 #     calculate ocean heat content integrated to the 26C isotherm
@@ -137,7 +296,57 @@ def return_target_transect(target_lons, target_lats):
     return targetlon, targetlat
 
 
-def calculate_density_3d(salinity, temperature, depth):
-    depth_broadcast = np.tile(depth, (temperature.shape[2], temperature.shape[1], 1)).T
-    density = sw.dens(salinity, temperature, depth_broadcast)
-    return density
+def calculate_density_3d(salinity, temperature, depth, axis=0, out=None, dtype=None, block_size=None):
+    """
+    Calculate in-situ density for a cube of salinity and temperature, one block of depth levels at a time. Depth is
+    broadcast to each block instead of being copied to the shape of the cube, so peak memory is the input and
+    output plus one block. Dask-backed xarray or dask arrays are calculated lazily.
+    :param salinity: array of salinity with depth along axis (e.g. depth, lat, lon)
+    :param temperature: array of seawater temperature with the same shape as salinity
+    :param depth: 1D array of depths (used as pressure) corresponding to axis
+    :param axis: optional depth axis, default is 0
+    :param out: optional preallocated output array (e.g. float32) with the same shape as temperature, numpy input
+    only
+    :param dtype: optional output dtype when out isn't provided, e.g. np.float32. Default is float64
+    :param block_size: optional number of depth levels calculated at once, numpy input only (dask input is calculated
+    one chunk at a time). Default is 1
+    :return: array of density (kg/m3), or a lazy DataArray/dask array for dask-backed input
+    """
+    depth = np.asarray(depth, dtype=float)
+    dtype = dtype or float
+
+    lazy = (isinstance(temperature, xr.DataArray) and temperature.chunks) or hasattr(temperature, 'dask')
+    if lazy and (out is not None or block_size is not None):
+        raise ValueError('out and block_size are only used for numpy input, rechunk dask input instead')
+    block_size = block_size or 1
+
+    def dens(salt, temp, pres):
+        return sw.dens(salt, temp, pres).astype(dtype, copy=False)
+
+    if isinstance(temperature, xr.DataArray) and temperature.chunks:
+        depth_da = xr.DataArray(depth, dims=[temperature.dims[axis]])
+        return xr.apply_ufunc(dens, salinity, temperature, depth_da, dask='parallelized', output_dtypes=[dtype])
+    if hasattr(temperature, 'dask'):
+        import dask.array as darray
+        shape = [1] * temperature.ndim
+        shape[axis] = len(depth)
+        chunks = [1] * temperature.ndim
+        chunks[axis] = temperature.chunks[axis]
+        pressure = darray.broadcast_to(darray.from_array(depth.reshape(shape), chunks=tuple(chunks)),
+                                       temperature.shape, chunks=temperature.chunks)
+        return darray.map_blocks(dens, salinity, temperature, pressure, dtype=dtype)
+
+    salinity = np.asarray(salinity)
+    temperature = np.asarray(temperature)
+    if out is None:
+        out = np.empty(temperature.shape, dtype=dtype)
+
+    shape = [1] * temperature.ndim
+    for k in range(0, len(depth), block_size):
+        block = [slice(None)] * temperature.ndim
+        block[axis] = slice(k, k + block_size)
+        block = tuple(block)
+        shape[axis] = len(depth[k:k + block_size])
+        out[block] = sw.dens(salinity[block], temperature[block], depth[k:k + block_size].reshape(shape))
+
+    return out
@@ -0,0 +1,206 @@
+#! /usr/bin/env python3
+
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+"""
+import datetime as dt
+import numpy as np
+import xarray as xr
+import netCDF4
+
+
+def track_heading(lons, lats):
+    """
+    Returns the direction of storm motion at each track point
+    :param lons: array of track longitudes
+    :param lats: array of track latitudes
+    :return: array of headings (radians counterclockwise from east)
+    """
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    if len(lons) < 2:
+        return np.zeros(len(lons))
+    dx = np.gradient(lons) * np.cos(np.deg2rad(lats))
+    dy = np.gradient(lats)
+    return np.arctan2(dy, dx)
+
+
+def storm_windows(lons, lats, headings=None, half_width=5, resolution=0.1):
+    """
+    Returns the longitudes and latitudes of a storm-centred grid at every track point. When headings are provided
+    the grids are rotated so x points in the direction of storm motion and y points to the left of the track.
+    :param lons: array of track longitudes
+    :param lats: array of track latitudes
+    :param headings: optional array of headings (radians counterclockwise from east), e.g. from track_heading
+    :param half_width: optional half width of the window (degrees latitude), default is 5
+    :param resolution: optional grid spacing (degrees latitude), default is 0.1
+    :return: x and y offsets (degrees) and the window longitudes and latitudes with shape (track point, y, x)
+    """
+    lons = np.asarray(lons, dtype=float)[:, np.newaxis, np.newaxis]
+    lats = np.asarray(lats, dtype=float)[:, np.newaxis, np.newaxis]
+    if headings is None:
+        headings = np.zeros(lons.shape[0])
+    headings = np.asarray(headings, dtype=float)[:, np.newaxis, np.newaxis]
+
+    offsets = np.arange(-half_width, half_width + resolution / 2, resolution)
+    x, y = np.meshgrid(offsets, offsets)
+    dlon = x * np.cos(headings) - y * np.sin(headings)
+    dlat = x * np.sin(headings) + y * np.cos(headings)
+
+    # offsets are distances in degrees latitude, so the longitude offsets are scaled at the storm center
+    window_lats = lats + dlat
+    window_lons = lons + dlon / np.cos(np.deg2rad(lats))
+
+    return offsets, offsets, window_lons, window_lats
+
+
+def model_times(time):
+    """
+    Returns model times as datetime64. Numeric times (e.g. GOFS, which is opened with decode_times=False) are
+    decoded with their units attribute.
+    :param time: xarray DataArray of model times
+    :return: array of datetime64[ns]
+    """
+    values = time.values
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]')
+    if not np.issubdtype(values.dtype, np.number):
+        raise ValueError('Unable to use model times with dtype {}'.format(values.dtype))
+    if 'units' not in time.attrs:
+        raise ValueError('Numeric model times have no units attribute')
+    decoded = netCDF4.num2date(values, time.attrs['units'], calendar=time.attrs.get('calendar', 'standard'),
+                               only_use_cftime_datetimes=False)
+    return np.array(decoded, dtype='datetime64[ns]')
+
+
+def nearest_time_index(times, target_times):
+    """
+    Returns the index of the nearest time for each target time, -1 if the target time is outside of the times
+    :param times: sorted array of datetime64
+    :param target_times: array of datetime64
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    target_times = np.asarray(target_times, dtype='datetime64[ns]')
+    if len(times) == 1:
+        idx = np.zeros(len(target_times), dtype=int)
+    else:
+        hi = np.clip(np.searchsorted(times, target_times), 1, len(times) - 1)
+        lo = hi - 1
+        idx = np.where(target_times - times[lo] <= times[hi] - target_times, lo, hi)
+    outside = np.logical_or(target_times < times[0], target_times > times[-1])
+    return np.where(outside, -1, idx)
+
+
+def sample_fields(field, grid_lons, grid_lats, time_idx, lons, lats):
+    """
+    Bilinearly interpolates a field on a regular grid to many points at once
+    :param field: array with shape (time, lat, lon)
+    :param grid_lons: 1D array of increasing grid longitudes
+    :param grid_lats: 1D array of increasing grid latitudes
+    :param time_idx: array of time indices with shape (track point), -1 for missing
+    :param lons: array of longitudes with shape (track point, y, x)
+    :param lats: array of latitudes with shape (track point, y, x)
+    :return: array of interpolated values with shape (track point, y, x), nan outside of the grid
+    """
+    fy = np.interp(lats, grid_lats, np.arange(len(grid_lats)), left=np.nan, right=np.nan)
+    fx = np.interp(lons, grid_lons, np.arange(len(grid_lons)), left=np.nan, right=np.nan)
+    outside = np.logical_or(np.logical_or(np.isnan(fx), np.isnan(fy)), time_idx[:, np.newaxis, np.newaxis] < 0)
+    fy = np.where(outside, 0, fy)
+    fx = np.where(outside, 0, fx)
+
+    y0 = np.clip(np.floor(fy).astype(int), 0, np.maximum(len(grid_lats) - 2, 0))
+    x0 = np.clip(np.floor(fx).astype(int), 0, np.maximum(len(grid_lons) - 2, 0))
+    y1 = np.minimum(y0 + 1, len(grid_lats) - 1)
+    x1 = np.minimum(x0 + 1, len(grid_lons) - 1)
+    wy = fy - y0
+    wx = fx - x0
+    t = np.broadcast_to(np.maximum(time_idx, 0)[:, np.newaxis, np.newaxis], fy.shape)
+
+    values = ((1 - wy) * (1 - wx) * field[t, y0, x0] + (1 - wy) * wx * field[t, y0, x1] +
+              wy * (1 - wx) * field[t, y1, x0] + wy * wx * field[t, y1, x1])
+    return np.where(outside, np.nan, values)
+
+
+def storm_composite(da, coordnames, track_times, track_lons, track_lats, pre_days=2, post_days=2, half_width=5,
+                    resolution=0.1, rotate=True, sids=None):
+    """
+    Extracts storm-centred windows of a model field at every track point before and after the storm. Track points
+    from several storms (e.g. a season) can be passed together with their storm ids: headings are calculated for
+    each storm separately and the model times and area needed by each storm are read at once.
+    :param da: xarray DataArray of a 2D field (e.g. SST, or ohc from common.derived_fields_timeseries) with time,
+    latitude and longitude dimensions on a regular grid
+    :param coordnames: dictionary containing names of dimensions with keys: time, lat, lon
+    :param track_times: array of track times (datetime)
+    :param track_lons: array of track longitudes, in the same convention as the model (e.g. convert to GOFS
+    longitudes with gofs.convert_target_gofs_lon)
+    :param track_lats: array of track latitudes
+    :param pre_days: optional number of days before the storm for the pre-storm field, default is 2
+    :param post_days: optional number of days after the storm for the post-storm field, default is 2
+    :param half_width: optional half width of the window (degrees latitude), default is 5
+    :param resolution: optional grid spacing of the window (degrees latitude), default is 0.1
+    :param rotate: optional, True rotates the windows so x points in the direction of storm motion, default is True
+    :param sids: optional array of storm ids (e.g. IBTrACS SID) for each track point, default is one storm. The
+    points of each storm must be in time order.
+    :return: xarray dataset with pre, post and difference (post - pre) with dimensions (track, y, x)
+    """
+    track_times = np.array(track_times, dtype='datetime64[ns]')
+    track_lons = np.asarray(track_lons, dtype=float)
+    track_lats = np.asarray(track_lats, dtype=float)
+    if sids is None:
+        storm_idx = np.zeros(len(track_times), dtype=int)
+    else:
+        sids = np.asarray(sids)
+        storm_idx = np.unique(sids, return_inverse=True)[1]
+    da = da.sortby([coordnames['lat'], coordnames['lon']])
+    times = model_times(da[coordnames['time']])
+    grid_lats = da[coordnames['lat']].values
+    grid_lons = da[coordnames['lon']].values
+
+    x = y = np.arange(-half_width, half_width + resolution / 2, resolution)
+    shape = (len(track_times), len(y), len(x))
+    wlons = np.full(shape, np.nan)
+    wlats = np.full(shape, np.nan)
+    pre = np.full(shape, np.nan)
+    post = np.full(shape, np.nan)
+    for si in np.unique(storm_idx):
+        idx = np.flatnonzero(storm_idx == si)
+        headings = track_heading(track_lons[idx], track_lats[idx]) if rotate else None
+        _, _, wlons[idx], wlats[idx] = storm_windows(track_lons[idx], track_lats[idx], headings, half_width,
+                                                     resolution)
+
+        # find the pre- and post-storm model times, then read the times and area needed by the storm at once
+        pre_idx = nearest_time_index(times, track_times[idx] - np.timedelta64(dt.timedelta(days=pre_days)))
+        post_idx = nearest_time_index(times, track_times[idx] + np.timedelta64(dt.timedelta(days=post_days)))
+        read_idx = np.unique(np.concatenate((pre_idx, post_idx)))
+        read_idx = read_idx[read_idx >= 0]
+
+        lat_idx = np.flatnonzero(np.logical_and(grid_lats >= np.nanmin(wlats[idx]) - 1,
+                                                grid_lats <= np.nanmax(wlats[idx]) + 1))
+        lon_idx = np.flatnonzero(np.logical_and(grid_lons >= np.nanmin(wlons[idx]) - 1,
+                                                grid_lons <= np.nanmax(wlons[idx]) + 1))
+        if len(read_idx) == 0 or len(lat_idx) == 0 or len(lon_idx) == 0:
+            continue
+
+        lat_slice = slice(lat_idx[0], lat_idx[-1] + 1)
+        lon_slice = slice(lon_idx[0], lon_idx[-1] + 1)
+        field = da.isel({coordnames['time']: read_idx, coordnames['lat']: lat_slice,
+                         coordnames['lon']: lon_slice}).transpose(coordnames['time'], coordnames['lat'],
+                                                                  coordnames['lon']).values
+        pre_idx = np.where(pre_idx >= 0, np.searchsorted(read_idx, pre_idx), -1)
+        post_idx = np.where(post_idx >= 0, np.searchsorted(read_idx, post_idx), -1)
+        pre[idx] = sample_fields(field, grid_lons[lon_slice], grid_lats[lat_slice], pre_idx, wlons[idx], wlats[idx])
+        post[idx] = sample_fields(field, grid_lons[lon_slice], grid_lats[lat_slice], post_idx, wlons[idx],
+                                  wlats[idx])
+
+    dims = ('track', 'y', 'x')
+    coords = dict(time=('track', track_times), center_lon=('track', track_lons), center_lat=('track', track_lats),
+                  x=x, y=y, lon=(dims, wlons), lat=(dims, wlats))
+    if sids is not None:
+        coords['sid'] = ('track', sids)
+    composite = xr.Dataset(dict(pre=(dims, pre), post=(dims, post), difference=(dims, post - pre)), coords=coords)
+    composite.attrs['pre_days'] = pre_days
+    composite.attrs['post_days'] = post_days
+    composite.attrs['rotated'] = int(rotate)
+
+    return composite
@@ -2,9 +2,23 @@
 
 """
 Author: Lori Garzio on 3/16/2021
-Last modified: 3/16/2021
+Last modified: 10/17/2026
 """
+import os
+import glob
+import json
+import hashlib
+import uuid
+import time
+import threading
+import numpy as np
 import pandas as pd
+import xarray as xr
+import netCDF4
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from erddapy import ERDDAP
 
 
@@ -35,6 +49,335 @@ def get_erddap_nc(server, ds_id, var_list=None, constraints=None):
     return ds
 
 
+def pooled_session(max_connections=8, retries=3, backoff=1):
+    """
+    Returns an HTTP session with a connection pool that retries failed requests
+    :param max_connections: optional maximum number of connections kept open per host, default is 8
+    :param retries: optional number of times to retry a request that fails with a connection error or a 429, 502,
+    503 or 504 response, default is 3
+    :param backoff: optional backoff factor in seconds, retries wait backoff * 2^(retry - 1) seconds, default is 1
+    :return: requests.Session
+    """
+    retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=[429, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def read_response(response, deadline, ds_id, chunk_size=64 * 1024):
+    """
+    Reads a streamed response before a deadline, then closes it. The response is read in a separate thread, so a
+    response that trickles in or stalls can't block past the deadline (the thread closes the response when its
+    read ends).
+    :param response: streamed requests.Response
+    :param deadline: time.monotonic() deadline
+    :param ds_id: dataset ID used in the error message
+    :param chunk_size: optional number of bytes read at once, default is 64 KB
+    :return: list of byte strings
+    """
+    chunks = []
+    errors = []
+
+    def read():
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                chunks.append(chunk)
+        except (requests.RequestException, OSError) as err:
+            errors.append(err)
+        finally:
+            response.close()
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    reader.join(max(deadline - time.monotonic(), 0))
+    if reader.is_alive() or (errors and isinstance(errors[0], (requests.Timeout, requests.ConnectionError))):
+        # a stalled read raises a ConnectionError (read timed out) in requests, reported the same as a slow download
+        raise requests.Timeout('Download of {} did not finish before the deadline'.format(ds_id))
+    if errors:
+        raise errors[0]
+
+    return chunks
+
+
+def fetch_erddap_nc(session, server, ds_id, var_list=None, constraints=None, timeout=120):
+    """
+    Downloads a netcdf dataset for a specified dataset ID with an existing HTTP session
+    :param session: requests.Session, e.g. from pooled_session
+    :param server: e.g. 'https://data.ioos.us/gliders/erddap'
+    :param ds_id: dataset ID e.g. ng314-20200806T2040
+    :param var_list: optional list of variables
+    :param constraints: optional list of constraints
+    :param timeout: optional maximum number of seconds for the whole download, default is 120
+    :return: netcdf dataset, or None if no data are available
+    """
+    e = ERDDAP(server=server,
+               protocol='tabledap',
+               response='nc')
+    e.dataset_id = ds_id
+    if constraints:
+        e.constraints = constraints
+    if var_list:
+        e.variables = var_list
+
+    # the requests timeout only applies to each socket operation, so the whole download also has a deadline
+    deadline = time.monotonic() + timeout
+    r = session.get(e.get_download_url(), timeout=timeout, stream=True)
+    if r.status_code == 404:  # ERDDAP returns 404 when there is no data for the constraints
+        r.close()
+        print('No dataset available for specified constraints: {}'.format(ds_id))
+        return None
+    if not r.ok:
+        r.close()
+        r.raise_for_status()
+    chunks = read_response(r, deadline, ds_id)
+
+    nc = netCDF4.Dataset('{}.nc'.format(ds_id), memory=b''.join(chunks))
+    ds = xr.open_dataset(xr.backends.NetCDF4DataStore(nc)).load()
+    nc.close()
+    ds = ds.sortby(ds.time)
+
+    return ds
+
+
+def get_erddap_nc_bulk(server, ds_ids, var_list=None, constraints=None, max_workers=8, retries=3, backoff=1,
+                       timeout=120):
+    """
+    Downloads netcdf datasets for many dataset IDs concurrently, sharing one pooled HTTP session
+    :param server: e.g. 'https://data.ioos.us/gliders/erddap'
+    :param ds_ids: list of dataset IDs
+    :param var_list: optional list of variables
+    :param constraints: optional list of constraints
+    :param max_workers: optional maximum number of simultaneous downloads, default is 8
+    :param retries: optional number of times to retry a failed request, default is 3
+    :param backoff: optional backoff factor in seconds for the retries, default is 1
+    :param timeout: optional maximum number of seconds for the download of each dataset, default is 120
+    :return: dictionary of netcdf datasets keyed by dataset ID, datasets that aren't available are None
+    """
+    session = pooled_session(max_workers, retries, backoff)
+    datasets = dict()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_erddap_nc, session, server, ds_id, var_list, constraints, timeout): ds_id
+                   for ds_id in ds_ids}
+        for f in as_completed(futures):
+            ds_id = futures[f]
+            try:
+                datasets[ds_id] = f.result()
+            except (requests.RequestException, OSError) as err:
+                print('Unable to download {}: {}'.format(ds_id, err))
+                datasets[ds_id] = None
+    session.close()
+
+    # return the datasets in the same order as the dataset IDs
+    return {ds_id: datasets[ds_id] for ds_id in ds_ids}
+
+
+def store_key(var_list=None, constraints=None):
+    """
+    Returns a unique key for the variables and constraints of a glider store, so different requests for the same
+    deployment are kept apart
+    :param var_list: optional list of variables
+    :param constraints: optional list of constraints
+    :return: hash string
+    """
+    key = [sorted(var_list or []), {k: str(v) for k, v in (constraints or {}).items()}]
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_glider_store(store_dir, ds_id, var_list=None, constraints=None):
+    """
+    Returns the data in the local store for a glider deployment
+    :param store_dir: directory containing the local glider store
+    :param ds_id: dataset ID e.g. ng314-20200806T2040
+    :param var_list: optional list of variables used to sync the store
+    :param constraints: optional list of constraints used to sync the store
+    :return: dataframe with one row per observation, or None if there is no data in the store
+    """
+    files = sorted(glob.glob(os.path.join(store_dir, ds_id, store_key(var_list, constraints), 'part-*.parquet')))
+    if len(files) == 0:
+        return None
+    return pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+
+
+def sync_glider(server, ds_id, store_dir, var_list=None, constraints=None, session=None):
+    """
+    Updates the local store for a glider deployment (a directory of parquet files) with the rows that were added to
+    ERDDAP since the last sync. The last time in the store is saved, and only rows with a later time are downloaded
+    and appended as a new parquet file. Each var_list and constraints combination has its own store.
+    :param server: e.g. 'https://data.ioos.us/gliders/erddap'
+    :param ds_id: dataset ID e.g. ng314-20200806T2040
+    :param store_dir: directory containing the local glider store
+    :param var_list: optional list of variables, must include time
+    :param constraints: optional list of constraints
+    :param session: optional requests.Session, e.g. from pooled_session
+    :return: dataframe with all of the rows in the store
+    """
+    deploy_dir = os.path.join(store_dir, ds_id, store_key(var_list, constraints))
+    os.makedirs(deploy_dir, exist_ok=True)
+    state_file = os.path.join(deploy_dir, 'sync.json')
+
+    state = dict()
+    if os.path.isfile(state_file):
+        with open(state_file) as f:
+            state = json.load(f)
+
+    sync_constraints = dict(constraints or {})
+    if state.get('last_time'):
+        sync_constraints['time>='] = state['last_time']
+
+    if session:
+        try:
+            ds = fetch_erddap_nc(session, server, ds_id, var_list, sync_constraints)
+        except (requests.RequestException, OSError) as err:
+            print('Unable to download {}: {}'.format(ds_id, err))
+            ds = None
+    else:
+        ds = get_erddap_nc(server, ds_id, var_list, sync_constraints)
+
+    if ds is not None and ds.time.size > 0:
+        df = ds.to_dataframe().reset_index(drop=True)
+        df['time'] = pd.to_datetime(df.time)
+
+        # rows at the last synced time are downloaded again, drop the ones that are already in the store. Whole rows
+        # are compared, so distinct rows at the same time are kept
+        tmin = df.time.min()
+        parts = sorted(glob.glob(os.path.join(deploy_dir, 'part-*.parquet')))
+        stored = []
+        for part in parts:
+            if pd.to_datetime(pd.read_parquet(part, columns=['time'])['time']).max() >= tmin:
+                pdf = pd.read_parquet(part)
+                pdf['time'] = pd.to_datetime(pdf.time)
+                stored.append(pdf[pdf.time >= tmin])
+        if len(stored) > 0:
+            stored = pd.concat(stored, ignore_index=True).drop_duplicates()
+            merged = df.merge(stored, how='left', on=list(df.columns), indicator=True)
+            df = df[merged['_merge'].values == 'left_only'].reset_index(drop=True)
+
+        if len(df) > 0:
+            # parts are numbered in the order they were added, with a random suffix so names are always unique
+            fname = 'part-{:06d}-{}.parquet'.format(len(parts), uuid.uuid4().hex[0:8])
+            df.to_parquet(os.path.join(deploy_dir, fname), index=False)
+            state['last_time'] = df.time.max().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+            with open(state_file, 'w') as f:
+                json.dump(state, f)
+        print('Added {} rows to {}'.format(len(df), ds_id))
+
+    return load_glider_store(store_dir, ds_id, var_list, constraints)
+
+
+def build_profile_index(time, depth, lat, lon, min_points=10, min_depth_range=5, max_gap=600):
+    """
+    Splits glider rows into individual profiles (dives and climbs) wherever the vertical direction of the glider
+    changes or there is a gap in the data. Rows must be sorted by time.
+    :param time: array of times (datetime64)
+    :param depth: array of depths
+    :param lat: array of latitudes
+    :param lon: array of longitudes
+    :param min_points: optional minimum number of depth values in a profile, default is 10
+    :param min_depth_range: optional minimum depth range (m) of a profile, default is 5
+    :param max_gap: optional maximum time (seconds) between depth values in a profile, default is 600
+    :return: dataframe with one row per profile and columns: profile_id, time, lat, lon, row_offset, row_length,
+    direction, depth_min, depth_max. The dataframe is empty if there are fewer than two depth values
+    """
+    time = np.asarray(time, dtype='datetime64[ns]')
+    depth = np.asarray(depth, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+
+    rows = np.where(~np.isnan(depth))[0]
+    if len(rows) < 2:
+        return pd.DataFrame(dict(profile_id=np.array([], dtype=int), time=np.array([], dtype='datetime64[ns]'),
+                                 lat=np.array([]), lon=np.array([]), row_offset=np.array([], dtype=int),
+                                 row_length=np.array([], dtype=int), direction=np.array([], dtype=object),
+                                 depth_min=np.array([]), depth_max=np.array([])))
+    d = depth[rows]
+    t = time[rows].astype('int64') / 1e9
+
+    # vertical direction between depth values, small changes keep the previous direction
+    dd = np.diff(d)
+    direction = np.sign(dd)
+    direction[np.abs(dd) < 0.05] = 0
+    direction = pd.Series(direction).replace(0, np.nan).ffill().bfill().values
+
+    # a new profile starts after a gap or after a row where the direction changes
+    breaks = np.diff(t) > max_gap
+    breaks[1:] = np.logical_or(breaks[1:], direction[1:] != direction[:-1])
+    starts = np.concatenate(([0], np.where(breaks)[0] + 1))
+    ends = np.append(starts[1:], len(rows))
+
+    counts = ends - starts
+    dmin = np.minimum.reduceat(d, starts)
+    dmax = np.maximum.reduceat(d, starts)
+    keep = np.logical_and(counts >= min_points, dmax - dmin >= min_depth_range)
+
+    row_offset = rows[starts]
+    row_length = rows[ends - 1] + 1 - row_offset
+
+    # mean time and location of each profile
+    tmean = np.add.reduceat(t, starts) / counts
+    latlon = []
+    for coord in [lat, lon]:
+        c = coord[rows]
+        ok = ~np.isnan(c)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            latlon.append(np.add.reduceat(np.where(ok, c, 0), starts) / np.add.reduceat(ok, starts))
+
+    profiles = pd.DataFrame(dict(time=pd.to_datetime(tmean[keep] * 1e9), lat=latlon[0][keep], lon=latlon[1][keep],
+                                 row_offset=row_offset[keep], row_length=row_length[keep],
+                                 direction=np.where(direction[np.minimum(starts, len(dd) - 1)][keep] > 0, 'dive',
+                                                    'climb'),
+                                 depth_min=dmin[keep], depth_max=dmax[keep]))
+    profiles.insert(0, 'profile_id', np.arange(len(profiles)))
+
+    return profiles
+
+
+def return_profile(data, profile):
+    """
+    Returns the rows for one profile as slices of the original arrays (views, the data aren't copied)
+    :param data: dictionary of numpy arrays with one value per row, e.g. {'depth': ..., 'temperature': ...}
+    :param profile: row of the profile index from build_profile_index
+    :return: dictionary of arrays for the profile
+    """
+    start = int(profile['row_offset'])
+    stop = start + int(profile['row_length'])
+    return {k: v[start:stop] for k, v in data.items()}
+
+
+def nearest_profile(profiles, target_time, target_lon=None, target_lat=None, time_window=30):
+    """
+    Finds the profile closest to a time and optional location. If a location is provided, the closest profile to the
+    location within time_window of target_time is returned, otherwise the profile closest in time.
+    :param profiles: profile index from build_profile_index
+    :param target_time: time (datetime)
+    :param target_lon: optional longitude
+    :param target_lat: optional latitude
+    :param time_window: optional time window (minutes) for the location search, default is 30
+    :return: row of the profile index, or None if the profile index is empty
+    """
+    if len(profiles) == 0:
+        return None
+    ptime = profiles['time'].values
+    target_time = np.datetime64(pd.Timestamp(target_time).to_datetime64(), 'ns')
+    i = np.searchsorted(ptime, target_time)
+    candidates = [c for c in [i - 1, i] if 0 <= c < len(ptime)]
+    closest = min(candidates, key=lambda c: abs(ptime[c] - target_time))
+
+    if target_lon is not None and target_lat is not None:
+        window = np.timedelta64(int(time_window * 60), 's')
+        i0 = np.searchsorted(ptime, target_time - window)
+        i1 = np.searchsorted(ptime, target_time + window, side='right')
+        if i1 > i0:
+            plat = np.radians(profiles['lat'].values[i0:i1])
+            dlat = plat - np.radians(target_lat)
+            dlon = np.radians(profiles['lon'].values[i0:i1] - target_lon)
+            a = np.sin(dlat / 2) ** 2 + np.cos(plat) * np.cos(np.radians(target_lat)) * np.sin(dlon / 2) ** 2
+            closest = i0 + np.nanargmin(a)
+
+    return profiles.iloc[closest]
+
+
 def return_glider_ids(server, kwargs):
     """
     Searches an ERDDAP server for datasets and returns dataset IDs
@@ -2,74 +2,175 @@
 
 """
 Author: Lori Garzio on 2/24/2021
-Last modified: 3/29/2021
+Last modified: 10/17/2026
 """
 import numpy as np
 import xarray as xr
 import datetime as dt
+import pandas as pd
 import netCDF4
+import functions.common as cf
+import functions.cache as cache
+import functions.handles as handles
 
 # urls for GOFS 3.1
 # url_gofs = 'https://tds.hycom.org/thredds/dodsC/GLBy0.08/expt_93.0/ts3z'  # temperature and salinity
 # url_gofs = 'https://tds.hycom.org/thredds/dodsC/GLBy0.08/expt_93.0/uv3z'  # u and v
 
+# contiguous grid index slices for coordinate limits, keyed by (url, coordlims)
+subset_slices = dict()
+
+max_time_offset = dt.timedelta(hours=3)  # maximum time between a point and the GOFS time used for it
+
 
 def convert_target_gofs_lon(target_lon):
-    target_convert = np.array([])
-    if np.logical_or(isinstance(target_lon, float), isinstance(target_lon, int)):
-        target_lon = np.array([target_lon])
-    for tc in target_lon:
-        if tc < 0:
-            target_convert = np.append(target_convert, 360 + tc)
-        else:
-            target_convert = np.append(target_convert, tc)
-    return target_convert
+    """
+    Converts longitudes from -180 to 180 to the GOFS convention of 0 to 360
+    :param target_lon: longitude, list/array of longitudes, or xarray DataArray
+    :return: converted longitudes with the same dtype (and coordinates for a DataArray). Scalars are returned as an
+    array with one value
+    """
+    if isinstance(target_lon, xr.DataArray):
+        return target_lon.where(target_lon >= 0, target_lon + 360)
+    target_lon = np.atleast_1d(target_lon)
+    return np.where(target_lon < 0, target_lon + 360, target_lon)
 
 
 def convert_gofs_target_lon(gofs_lon):
-    gofslon_convert = np.array([])
-    if np.logical_or(isinstance(gofs_lon, float), isinstance(gofs_lon, int)):
-        gofs_lon = np.array([gofs_lon])
-    for gl in gofs_lon:
-        if gl > 180:
-            gofslon_convert = np.append(gofslon_convert, gl - 360)
-        else:
-            gofslon_convert = np.append(gofslon_convert, gl)
-    return gofslon_convert
+    """
+    Converts longitudes from the GOFS convention of 0 to 360 to -180 to 180
+    :param gofs_lon: longitude, list/array of longitudes, or xarray DataArray
+    :return: converted longitudes with the same dtype (and coordinates for a DataArray). Scalars are returned as an
+    array with one value
+    """
+    if isinstance(gofs_lon, xr.DataArray):
+        return gofs_lon.where(gofs_lon <= 180, gofs_lon - 360)
+    gofs_lon = np.atleast_1d(gofs_lon)
+    return np.where(gofs_lon > 180, gofs_lon - 360, gofs_lon)
 
 
-def get_ds(varname, st, et):
+def get_url(varname):
     if varname in ['tau', 'water_temp', 'water_temp_bottom', 'salinity', 'salinity_bottom']:
         url = 'https://tds.hycom.org/thredds/dodsC/GLBy0.08/expt_93.0/ts3z'  # temperature and salinity
     else:
         url = 'https://tds.hycom.org/thredds/dodsC/GLBy0.08/expt_93.0/uv3z'  # u and v
+    return url
+
+
+def open_url(url):
+    """
+    Opens a GOFS aggregation, kept open in the process-wide dataset pool so repeated calls reuse it. The
+    aggregation is reopened after handles.url_ttl seconds so new model times are seen.
+    :param url: GOFS url
+    :return: xarray dataset
+    """
+    return handles.get_dataset(('GOFS', url), lambda: xr.open_dataset(url, decode_times=False), handles.url_ttl)
+
+
+def get_ds(varname, st, et):
+    url = get_url(varname)
 
-    ds = xr.open_dataset(url, decode_times=False)
+    ds = open_url(url)
     if et - st == dt.timedelta(0):
         ds = ds.sel(time=netCDF4.date2num(st, ds.time.units), method='nearest')
     else:
-        print('figure out time slicing')
+        ds = ds.sel(time=slice(netCDF4.date2num(st, ds.time.units), netCDF4.date2num(et, ds.time.units)))
 
     return ds
 
 
+def limit_indices(values, lims, name):
+    """
+    Returns the indices of the grid values inside coordinate limits. Limits narrower than the grid spacing return
+    the grid point nearest to the middle of the limits.
+    :param values: array of grid coordinates
+    :param lims: [min, max]
+    :param name: coordinate name used in the error message
+    :return: array of indices
+    """
+    ind = np.where(np.logical_and(values > lims[0], values < lims[1]))[0]
+    if len(ind) == 0:
+        if lims[0] > lims[1] or lims[0] > np.nanmax(values) or lims[1] < np.nanmin(values):
+            raise ValueError('GOFS {} limits {} to {} are outside of the grid ({} to {})'.format(
+                name, lims[0], lims[1], np.nanmin(values), np.nanmax(values)))
+        ind = np.array([np.nanargmin(abs(values - np.mean(lims)))])
+
+    return ind
+
+
+def return_subset_slices(ds, coordlims, url=None):
+    """
+    Converts coordinate limits to contiguous index slices of the GOFS grid. The slices are calculated once per grid
+    and coordinate limits.
+    :param ds: GOFS dataset
+    :param coordlims: [lon min, lon max, lat min, lat max], longitudes -180 to 180
+    :param url: optional GOFS url used to identify the grid, default is the url for temperature and salinity
+    :return: latitude slice and a list of longitude slices ordered west to east. There are two longitude slices
+    when the limits cross the 0/360 longitude seam
+    """
+    if not url:
+        url = get_url('water_temp')
+    key = (url, tuple(float(c) for c in coordlims))
+    if key in subset_slices:
+        return subset_slices[key]
+
+    lat = ds.lat.values
+    lon_convert = convert_gofs_target_lon(ds.lon.values)
+    lat_ind = limit_indices(lat, coordlims[2:4], 'latitude')
+    lon_ind = limit_indices(lon_convert, coordlims[0:2], 'longitude')
+    lat_slice = slice(lat_ind[0], lat_ind[-1] + 1)
+
+    # split the longitude indices wherever they aren't consecutive (where the limits cross the seam)
+    lon_groups = np.split(lon_ind, np.where(np.diff(lon_ind) > 1)[0] + 1)
+    lon_groups = sorted(lon_groups, key=lambda g: lon_convert[g[0]])
+    lon_slices = [slice(g[0], g[-1] + 1) for g in lon_groups]
+
+    subset_slices[key] = (lat_slice, lon_slices)
+    return lat_slice, lon_slices
+
+
+def subset_grid(da, coordlims, url=None):
+    """
+    Subsets a GOFS variable to coordinate limits with one contiguous hyperslab request (two if the limits cross the
+    0/360 longitude seam)
+    :param da: GOFS DataArray with lat and lon dims
+    :param coordlims: [lon min, lon max, lat min, lat max], longitudes -180 to 180
+    :param url: optional GOFS url used to identify the grid
+    :return: xarray DataArray
+    """
+    lat_slice, lon_slices = return_subset_slices(da, coordlims, url)
+    subset = [da.isel(lat=lat_slice, lon=ls) for ls in lon_slices]
+    if len(subset) == 1:
+        subset = subset[0]
+    else:
+        subset = xr.concat(subset, dim='lon')
+
+    return subset
+
+
 def return_gridded_ds(varname, start_time, end_time, coordlims, depth_slice=None):
+    key = cache.cache_key(varname, start_time, end_time, coordlims, depth_slice, 'gridded', get_url(varname))
+    vardata = cache.load(key)
+    if vardata is not None:
+        return vardata
+
     ds = get_ds(varname, start_time, end_time)
     if depth_slice:
         ds = ds.sel(depth=slice(depth_slice[0], depth_slice[1]))
 
-    lon = ds.lon.values
-    lat = ds.lat.values
-
-    lon_convert = convert_gofs_target_lon(lon)
-    lon_ind = np.logical_and(lon_convert > coordlims[0], lon_convert < coordlims[1])
-    lat_ind = np.logical_and(lat > coordlims[2], lat < coordlims[3])
-    vardata = np.squeeze(ds[varname])[:, lat_ind, lon_ind]
+    vardata = np.squeeze(subset_grid(ds[varname], coordlims, get_url(varname)))
+    vardata = cache.store(key, vardata)
 
     return vardata
 
 
 def return_point(varname, start_time, end_time, target_lon, target_lat):
+    key = cache.cache_key(varname, start_time, end_time, [target_lon, target_lon, target_lat, target_lat],
+                          kind='point', url=get_url(varname))
+    target_ds = cache.load(key)
+    if target_ds is not None:
+        return target_ds
+
     ds = get_ds(varname, start_time, end_time)
 
     lat = ds.lat.values
@@ -80,11 +181,76 @@ def return_point(varname, start_time, end_time, target_lon, target_lat):
     lat_idx = np.argmin(abs(lat - target_lat))
     lon_idx = np.argmin(abs(lon - target_lon))
 
-    target_ds = np.squeeze(ds[varname])[:, lat_idx, lon_idx]
+    target_ds = np.squeeze(ds[varname].isel(lat=lat_idx, lon=lon_idx))
+    target_ds = cache.store(key, target_ds)
 
     return target_ds
 
 
+def return_points(varnames, times, target_lons, target_lats, max_offset=None):
+    """
+    Returns GOFS profiles at many locations and times. Each GOFS aggregation is opened once, and the profiles for
+    each model time are grabbed in one request.
+    :param varnames: list of variable names
+    :param times: array of times (datetime)
+    :param target_lons: array of longitudes (-180 to 180)
+    :param target_lats: array of latitudes
+    :param max_offset: optional maximum time (timedelta) between a point and the closest GOFS time, default is
+    max_time_offset. Points further from a GOFS time (e.g. outside of the aggregation) are nan
+    :return: dictionary of xarray DataArrays with dims (point, depth) for each variable
+    """
+    if max_offset is None:
+        max_offset = max_time_offset
+    times = pd.to_datetime(np.atleast_1d(times)).to_pydatetime()
+    target_lons = np.atleast_1d(target_lons)
+    target_lats = np.atleast_1d(target_lats)
+
+    data = dict()
+    datasets = dict()
+    for varname in varnames:
+        url = get_url(varname)
+        if url not in datasets:
+            ds = open_url(url)
+            lat = handles.get_values(('GOFS', url), ds, 'lat')
+            lon = handles.get_values(('GOFS', url), ds, 'lon')
+            model_time = handles.get_values(('GOFS', url), ds, 'time')
+
+            # find the closest model time and grid point for each target (the GOFS axes are sorted)
+            tnum = netCDF4.date2num(times, ds.time.units)
+            tol = netCDF4.date2num(times[0] + max_offset, ds.time.units) - tnum[0]
+            time_idx = cf.nearest_index(model_time, tnum)
+            time_idx[abs(model_time[time_idx] - tnum) > tol] = -1
+            lat_idx = cf.nearest_index(lat, target_lats)
+            lon_idx = cf.nearest_index(lon, convert_target_gofs_lon(target_lons))
+            if np.all(time_idx < 0):
+                print('No GOFS times within {} of any of the {} points'.format(max_offset, len(times)))
+            datasets[url] = dict(ds=ds, time_idx=time_idx, lat_idx=lat_idx, lon_idx=lon_idx)
+
+        d = datasets[url]
+        depth = d['ds'].depth.values
+        vardata = np.empty((len(times), len(depth)))
+        vardata[:] = np.nan
+        for ti in np.unique(d['time_idx'][d['time_idx'] >= 0]):
+            idx = d['time_idx'] == ti
+            vardata[idx, :] = cf.gather_columns(d['ds'][varname].isel(time=ti), d['lat_idx'][idx],
+                                                d['lon_idx'][idx], 'lat', 'lon').T
+
+        ok = d['time_idx'] >= 0
+        model_time = np.empty(len(times), dtype='datetime64[ns]')
+        model_time[:] = np.datetime64('NaT')
+        if np.any(ok):
+            model_time[ok] = np.array(netCDF4.num2date(d['ds'].time.values[d['time_idx'][ok]], d['ds'].time.units,
+                                                       only_use_cftime_datetimes=False), dtype='datetime64[ns]')
+        model_lon = convert_gofs_target_lon(d['ds'].lon.values[d['lon_idx']])
+        model_lat = d['ds'].lat.values[d['lat_idx']]
+        data[varname] = xr.DataArray(vardata, dims=['point', 'depth'],
+                                     coords=dict(depth=depth, time=('point', model_time), lon=('point', model_lon),
+                                                 lat=('point', model_lat)),
+                                     name=varname)
+
+    return data
+
+
 def return_surface_variable(varname, start_time, end_time, coordlims, depth):
     """
     :param varname: variable name
@@ -93,24 +259,39 @@ def return_surface_variable(varname, start_time, end_time, coordlims, depth):
     :param coordlims: [lon min, lon max, lat min, lat max]
     :return: GOFS surface data object
     """
+    key = cache.cache_key(varname, start_time, end_time, coordlims, [depth, depth], 'surface', get_url(varname))
+    ds_surface = cache.load(key)
+    if ds_surface is not None:
+        return ds_surface
+
     ds = get_ds(varname, start_time, end_time)
-    lat = ds.lat.values
-    lon = ds.lon.values
 
     ds_surface = ds[varname].sel(depth=depth)
-    lon_convert = convert_gofs_target_lon(lon)
-    lon_ind = np.logical_and(lon_convert > coordlims[0], lon_convert < coordlims[1])
-    lat_ind = np.logical_and(lat > coordlims[2], lat < coordlims[3])
-    ds_surface = np.squeeze(ds_surface)[lat_ind, lon_ind]
+    ds_surface = np.squeeze(subset_grid(ds_surface, coordlims, get_url(varname)))
+    ds_surface = cache.store(key, ds_surface)
 
     return ds_surface
 
 
 def return_transect(varname, start_time, end_time, target_lons, target_lats):
-    ds = get_ds(varname, start_time, end_time)
+    # the cache holds the smallest box of model data that contains the transect
+    coordlims = [np.nanmin(target_lons), np.nanmax(target_lons), np.nanmin(target_lats), np.nanmax(target_lats)]
+    key = cache.cache_key(varname, start_time, end_time, coordlims, kind='transect', url=get_url(varname))
+    box = cache.load(key)
+    if box is None:
+        ds = get_ds(varname, start_time, end_time)
 
-    lat = ds.lat.values
-    lon = ds.lon.values
+        lat = ds.lat.values
+        lon = ds.lon.values
+        lon_lims = np.round(np.interp(coordlims[0:2], lon, np.arange(0, len(lon)))).astype(int)
+        lat_lims = np.round(np.interp(coordlims[2:4], lat, np.arange(0, len(lat)))).astype(int)
+
+        # grab all of the columns along the transect in one request
+        box = ds[varname].isel(lat=slice(lat_lims[0], lat_lims[1] + 1), lon=slice(lon_lims[0], lon_lims[1] + 1))
+        box = cache.store(key, box)
+
+    lat = box.lat.values
+    lon = box.lon.values
 
     # find the GOFS lat/lon indicies closest to the lats/lons provided
     lon_idx = np.round(np.interp(target_lons, lon, np.arange(0, len(lon)))).astype(int)
@@ -120,13 +301,7 @@ def return_transect(varname, start_time, end_time, target_lons, target_lats):
     lon_subset_convert = convert_gofs_target_lon(lon_subset)
     lat_subset = lat[lat_idx]
 
-    depth = ds.depth.values
-    # target_var = ds.variables[varname][:, lat_idx, lon_idx]
-    target_var = np.empty((len(depth), len(lon_idx)))
-    target_var[:] = np.nan
-
-    for pos in range(len(lon_idx)):
-        print(len(lon_idx), pos)
-        target_var[:, pos] = ds.variables[varname][:, lat_idx[pos], lon_idx[pos]]
+    depth = box.depth.values
+    target_var = cf.gather_columns(box, lat_idx, lon_idx, 'lat', 'lon')
 
     return target_var, depth, lon_subset_convert, lat_subset
@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# datasets that are open in this process, least recently used first
+open_datasets = OrderedDict()
+max_open = 16  # the least recently used dataset leaves the pool when more than this many datasets are open
+url_ttl = 3600  # seconds before a remote aggregation (e.g. GOFS) is reopened to see new model times
+pool_lock = threading.RLock()
+
+
+def get_dataset(key, opener, ttl=None):
+    """
+    Returns an open dataset from the pool, opening it the first time it is requested. Repeated requests for the
+    same file(s) or url reuse the opened, decoded dataset. Datasets that leave the pool (least recently used, or
+    older than ttl) aren't closed because callers may still be using them, they are closed when they are no longer
+    referenced.
+    :param key: key identifying the dataset, e.g. ('GOFS', url) or ('RTOFS', file names)
+    :param opener: function with no arguments that opens the dataset, e.g. lambda: xr.open_dataset(url)
+    :param ttl: optional number of seconds before the dataset is reopened, e.g. url_ttl for an aggregation that
+    grows. Default is to keep it until it leaves the pool.
+    :return: xarray dataset
+    """
+    with pool_lock:
+        entry = open_datasets.get(key)
+        if entry is not None and ttl is not None and time.time() - entry['opened'] > ttl:
+            del open_datasets[key]
+            entry = None
+        if entry is not None:
+            open_datasets.move_to_end(key)
+            return entry['ds']
+
+    ds = opener()
+    with pool_lock:
+        if key in open_datasets:  # another thread opened it first
+            ds.close()
+            open_datasets.move_to_end(key)
+            return open_datasets[key]['ds']
+        open_datasets[key] = dict(ds=ds, values=dict(), opened=time.time())
+        while len(open_datasets) > max_open:
+            open_datasets.popitem(last=False)
+
+    return ds
+
+
+def get_values(key, ds, varname):
+    """
+    Returns the values of a (coordinate) variable of a pooled dataset as a numpy array. The values are read once
+    and kept with the dataset, e.g. the 2D RTOFS Latitude and Longitude arrays.
+    :param key: key identifying the dataset
+    :param ds: the dataset returned by get_dataset for key
+    :param varname: variable name
+    :return: numpy array
+    """
+    with pool_lock:
+        entry = open_datasets.get(key)
+    values = entry['values'] if entry is not None and entry['ds'] is ds else dict()
+    if varname not in values:
+        values[varname] = ds[varname].values
+
+    return values[varname]
+
+
+def close_all():
+    """
+    Closes every dataset in the pool
+    """
+    with pool_lock:
+        while open_datasets:
+            key, entry = open_datasets.popitem(last=False)
+            entry['ds'].close()
@@ -0,0 +1,178 @@
+#! /usr/bin/env python3
+
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+"""
+import os
+import numpy as np
+import pandas as pd
+import xarray as xr
+import functions.cache as cache
+
+# track stores that have already been loaded, keyed by file name
+track_stores = dict()
+
+
+def decode_strings(values):
+    return np.array([v.decode('utf-8').strip() if isinstance(v, bytes) else str(v).strip() for v in values])
+
+
+def build_track_store(ibtracs_file, store_file, variables=None):
+    """
+    Converts an IBTrACS netcdf file to a compact table (parquet) with one row per track point. Fill values are
+    removed and the storm sid, name and season are stored with every point.
+    :param ibtracs_file: IBTrACS netcdf file, e.g. IBTrACS.last3years.v04r00.nc
+    :param store_file: output parquet file, None to only return the table
+    :param variables: optional list of track variables, default is lat, lon, usa_sshs, landfall, usa_wind, usa_pres
+    :return: dataframe with one row per track point
+    """
+    if not variables:
+        variables = ['lat', 'lon', 'usa_sshs', 'landfall', 'usa_wind', 'usa_pres']
+
+    ibnc = xr.open_dataset(ibtracs_file)
+    time = ibnc['time'].values
+    valid = ~np.isnat(time)
+    storm_idx, obs_idx = np.nonzero(valid)
+
+    df = pd.DataFrame(dict(storm=storm_idx,
+                           sid=decode_strings(ibnc['sid'].values)[storm_idx],
+                           name=decode_strings(ibnc['name'].values)[storm_idx],
+                           season=ibnc['season'].values.astype(int)[storm_idx],
+                           time=time[valid]))
+    for v in variables:
+        if v in ibnc:
+            df[v] = ibnc[v].values[valid]
+            if np.issubdtype(ibnc[v].encoding.get('dtype', float), np.integer):
+                df[v] = df[v].astype('Int64')  # keep integer variables as integers, fill values are missing
+    ibnc.close()
+
+    if 'landfall' in df.columns:
+        # there is always one less landfall value, replace the last value with the previous value
+        df['landfall'] = df.groupby('storm')['landfall'].ffill()
+
+    if store_file:
+        df.to_parquet(store_file, index=False)
+        track_stores.pop(store_file, None)
+
+    return df
+
+
+def return_track_store(ibtracs_file, store_file=None, cache_dir=None):
+    """
+    Returns the track store for an IBTrACS file, building it the first time or when the IBTrACS file is newer. The
+    store is saved next to the IBTrACS file, or in the local cache if that directory is read-only. If it can't be
+    saved anywhere, the table is kept in memory for this process.
+    :param ibtracs_file: IBTrACS netcdf file
+    :param store_file: optional parquet file, default is the IBTrACS file name with a .parquet extension
+    :param cache_dir: optional directory used when store_file can't be written, default is cache.cache_dir/IBTrACS
+    :return: track store file name, used to load the store with load_track_store and return_storm
+    """
+    if not store_file:
+        store_file = '{}.parquet'.format(os.path.splitext(ibtracs_file)[0])
+    if not cache_dir:
+        cache_dir = os.path.join(cache.cache_dir, 'IBTrACS')
+    store_files = [store_file, os.path.join(cache_dir, os.path.basename(store_file))]
+
+    for sf in store_files:
+        if os.path.isfile(sf) and os.path.getmtime(sf) >= os.path.getmtime(ibtracs_file):
+            return sf
+    if ibtracs_file in track_stores:  # built in memory earlier in this process
+        return ibtracs_file
+
+    print('\nBuilding IBTrACS track store: {}'.format(ibtracs_file))
+    df = build_track_store(ibtracs_file, None)
+    for sf in store_files:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(sf)), exist_ok=True)
+            df.to_parquet(sf, index=False)
+            track_stores[sf] = index_track_store(df)
+            print('Saved IBTrACS track store: {}'.format(sf))
+            return sf
+        except OSError:
+            print('Unable to save IBTrACS track store: {}'.format(sf))
+
+    track_stores[ibtracs_file] = index_track_store(df)
+    return ibtracs_file
+
+
+def index_track_store(df):
+    """
+    Indexes the rows for each storm by sid. Names aren't unique within a season (e.g. NOT_NAMED), so (name, season)
+    maps to the list of sids with that name.
+    :param df: track table from build_track_store
+    :return: dictionary with keys: df, sid, name
+    """
+    sid_rows = df.groupby('sid').indices
+    storms = df.drop_duplicates('sid')
+    name_sid = storms.groupby(['name', 'season'])['sid'].apply(list).to_dict()
+
+    return dict(df=df, sid=sid_rows, name=name_sid)
+
+
+def load_track_store(store_file):
+    """
+    Loads a track store and indexes the rows for each storm (see index_track_store)
+    :param store_file: parquet file created by build_track_store, or the name returned by return_track_store
+    :return: dictionary with keys: df, sid, name
+    """
+    if store_file not in track_stores:
+        track_stores[store_file] = index_track_store(pd.read_parquet(store_file))
+
+    return track_stores[store_file]
+
+
+def return_storm(store_file, variables, name=None, season=None, sid=None):
+    """
+    Returns the track of a storm, selected by sid or by name and season
+    :param store_file: parquet file created by build_track_store
+    :param variables: list of variables, e.g. ['time', 'lat', 'lon', 'usa_sshs', 'landfall']
+    :param name: storm name, e.g. 'Laura'
+    :param season: storm season, e.g. 2020
+    :param sid: IBTrACS storm id, used instead of name and season. Required when more than one storm in the season
+    has the name
+    :return: dictionary containing an array for each variable
+    """
+    store = load_track_store(store_file)
+    if not sid:
+        sids = store['name'].get((name.upper(), int(season)), [])
+        if len(sids) != 1:
+            raise ValueError('{} storms named {} in {}, select the storm by sid: {}'.format(len(sids), name, season,
+                                                                                          sids))
+        sid = sids[0]
+    rows = store['df'].iloc[store['sid'][sid]]
+
+    d = dict()
+    for v in variables:
+        data = rows[v].dropna()
+        if v == 'time':
+            data = pd.to_datetime(data.values).to_pydatetime()
+        elif pd.api.types.is_integer_dtype(data.dtype):
+            data = data.to_numpy(dtype=int)
+        else:
+            data = data.to_numpy()
+        d[v] = data
+    return d
+
+
+def storms_in_box(store_file, coordlims, start_time=None, end_time=None):
+    """
+    Finds the storms with track points in a region and time range
+    :param store_file: parquet file created by build_track_store
+    :param coordlims: [lon min, lon max, lat min, lat max]
+    :param start_time: optional start time (datetime)
+    :param end_time: optional end time (datetime)
+    :return: dataframe with the sid, name, season and first and last times in the region for each storm
+    """
+    df = load_track_store(store_file)['df']
+    idx = np.logical_and.reduce((df['lon'] >= coordlims[0], df['lon'] <= coordlims[1],
+                                 df['lat'] >= coordlims[2], df['lat'] <= coordlims[3]))
+    if start_time:
+        idx = np.logical_and(idx, df['time'] >= start_time)
+    if end_time:
+        idx = np.logical_and(idx, df['time'] <= end_time)
+
+    storms = df[idx].groupby(['sid', 'name', 'season'])['time'].agg(['min', 'max']).reset_index()
+    storms = storms.rename(columns={'min': 'time_start', 'max': 'time_end'}).sort_values('time_start')
+
+    return storms.reset_index(drop=True)
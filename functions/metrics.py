@@ -0,0 +1,140 @@
+#! /usr/bin/env python3
+
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+"""
+import numpy as np
+import xarray as xr
+import seawater as sw
+import functions.common as cf
+
+metric_names = ['ohc', 'd26', 'ild', 'mld', 'blt', 't100']
+metric_units = dict(ohc='KJ/cm2', d26='m', ild='m', mld='m', blt='m', t100='degrees_C')
+
+
+def depth_average(temp, depth, max_depth=100):
+    """
+    Vectorized depth-averaged temperature from the shallowest level to max_depth (e.g. T100). Temperature at
+    max_depth is linearly interpolated if it isn't a depth level.
+    :param temp: array of seawater temperature with depth along the last axis
+    :param depth: 1D array of depths
+    :param max_depth: optional maximum depth (m), default is 100
+    :return: array of depth-averaged temperature with the depth axis removed, nan if any level to max_depth is nan
+    or the depths don't reach max_depth
+    """
+    depth = np.asarray(depth, dtype=float)
+    if depth[-1] < max_depth:
+        return np.full(temp.shape[:-1], np.nan)
+
+    # trapezoid weights for the levels above max_depth, and the interpolated value at max_depth
+    k = np.searchsorted(depth, max_depth, side='right') - 1
+    dz = np.diff(np.append(depth[:k + 1], max_depth))
+    w = np.zeros(k + 1)
+    w[:-1] += dz[:-1] / 2
+    w[1:] += dz[:-1] / 2
+    w[-1] += dz[-1] / 2
+    integral = np.sum(temp[..., :k + 1] * w, axis=-1)
+    if dz[-1] > 0:
+        f = (max_depth - depth[k]) / (depth[k + 1] - depth[k])
+        t_max = temp[..., k] + f * (temp[..., k + 1] - temp[..., k])
+        integral += t_max * dz[-1] / 2
+
+    return integral / (max_depth - depth[0])
+
+
+def mld_density(sigma, depth, kref, threshold):
+    """
+    Vectorized mixed layer depth using a density criterion: the first depth below the reference level where
+    potential density is larger than the density at the reference level by more than the threshold
+    :param sigma: array of potential density with depth along the last axis
+    :param depth: 1D array of depths
+    :param kref: index of the reference depth
+    :param threshold: density threshold (kg/m3), a number or an array with the depth axis removed
+    :return: array of mixed layer depths (m) with the depth axis removed
+    """
+    sref = sigma[..., kref]
+    with np.errstate(invalid='ignore'):
+        exceed = sigma - (sref + threshold)[..., np.newaxis] > 0
+    exceed[..., 0:kref + 1] = False
+    mld = np.asarray(depth)[np.argmax(exceed, axis=-1)]
+
+    return np.where(np.logical_and(np.any(exceed, axis=-1), ~np.isnan(sref)), mld, np.nan)
+
+
+def upper_ocean_metrics(temp, salt, depth, axis=0, ref_depth=10, temp_threshold=0.2, density_threshold=None,
+                        t_depth=100):
+    """
+    Calculates upper ocean metrics for every column of a temperature/salinity array in one pass. The depth array
+    is only broadcast (never tiled), so memory use stays near the size of the input.
+    ohc: ocean heat content integrated to the 26C isotherm (KJ/cm2)
+    d26: depth of the 26C isotherm (m)
+    ild: isothermal layer depth, the mixed layer depth using the temperature criterion (m)
+    mld: mixed layer depth using the potential density criterion (m)
+    blt: barrier layer thickness, ild - mld (m)
+    t100: depth-averaged temperature to t_depth (degrees C)
+    :param temp: array of seawater temperature with depth along axis (e.g. depth, lat, lon)
+    :param salt: array of salinity with the same shape as temp
+    :param depth: 1D array of depths corresponding to axis
+    :param axis: optional depth axis of temp and salt, default is 0
+    :param ref_depth: optional reference depth (m) for the mixed layer depths, default is 10
+    :param temp_threshold: optional temperature threshold (degrees C) for the isothermal layer depth, default is 0.2
+    :param density_threshold: optional density threshold (kg/m3) for the mixed layer depth. Default is the density
+    change equivalent to a temp_threshold decrease in temperature at the reference depth, so the barrier layer
+    thickness is only due to salinity stratification
+    :param t_depth: optional depth (m) for the depth-averaged temperature, default is 100
+    :return: dictionary containing an array for each metric with the depth axis removed
+    """
+    temp = np.moveaxis(np.asarray(temp, dtype=float), axis, -1)
+    salt = np.moveaxis(np.asarray(salt, dtype=float), axis, -1)
+    depth = np.asarray(depth, dtype=float)
+    kref = np.argmin(abs(depth - ref_depth))
+
+    m = dict()
+    m['ohc'] = cf.ohc_integrate(temp, depth, axis=-1)
+    m['d26'] = cf.isotherm_depth(temp, depth, axis=-1)
+    m['ild'] = cf.mld_temperature(temp, depth, axis=-1, ref_depth=ref_depth, threshold=temp_threshold)
+
+    # potential density referenced to the surface, depth (1D) broadcasts along the last axis
+    sigma = sw.pden(salt, temp, depth) - 1000
+    if density_threshold is None:
+        tref = temp[..., kref]
+        sref = salt[..., kref]
+        density_threshold = sw.dens0(sref, tref - temp_threshold) - sw.dens0(sref, tref)
+    m['mld'] = mld_density(sigma, depth, kref, density_threshold)
+    m['blt'] = m['ild'] - m['mld']
+    m['t100'] = depth_average(temp, depth, t_depth)
+
+    return m
+
+
+def upper_ocean_metrics_ds(ds, varnames, coordnames, **kwargs):
+    """
+    Calculates upper ocean metrics for a model dataset. Dask-backed datasets stay lazy (keep depth in one chunk).
+    :param ds: xarray dataset of seawater temperature and salinity with a depth dimension
+    :param varnames: dictionary containing names of variables with keys: temp, salt
+    :param coordnames: dictionary containing names of dimensions with keys: depth
+    :param kwargs: optional arguments passed to upper_ocean_metrics
+    :return: xarray dataset containing ohc, d26, ild, mld, blt and t100
+    """
+    def calculate(temp, salt, depth):
+        # the metrics are stacked on one output dimension, dask='parallelized' only supports one output
+        m = upper_ocean_metrics(temp, salt, depth, axis=-1, **kwargs)
+        return np.stack([m[name] for name in metric_names], axis=-1)
+
+    dd = coordnames['depth']
+    args = (calculate, ds[varnames['temp']], ds[varnames['salt']], ds[dd])
+    kw = dict(input_core_dims=[[dd], [dd], [dd]], output_core_dims=[['metric']], dask='parallelized',
+              output_dtypes=[float])
+    sizes = {'metric': len(metric_names)}
+    try:
+        output = xr.apply_ufunc(*args, dask_gufunc_kwargs=dict(output_sizes=sizes), **kw)
+    except TypeError:  # xarray < 0.16
+        output = xr.apply_ufunc(*args, output_sizes=sizes, **kw)
+    output = output.assign_coords(metric=metric_names)
+
+    metrics = output.to_dataset(dim='metric')
+    for name in metric_names:
+        metrics[name].attrs['units'] = metric_units[name]
+
+    return metrics
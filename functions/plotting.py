@@ -2,19 +2,85 @@
 
 """
 Author: Lori Garzio on 2/19/2021
-Last modified: 2/19/2021
+Last modified: 10/17/2026
 """
-import xarray as xr
 import numpy as np
 import matplotlib.ticker as mticker
 import matplotlib as mpl
 from matplotlib.lines import Line2D
+from matplotlib.figure import Figure
+from matplotlib.collections import PathCollection
+import shapely.geometry as sgeom
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 import cmocean
+import functions.bathymetry as bathymetry
 
+# base map layers that have already been prepared, keyed by layer, extent and projection
+base_layers = dict()
 
-def add_map_features(axis, axes_limits=None, xlocs=None, landcolor=None, ecolor=None, bath_file=None):
+
+def map_layer(category, name, scale, projection, extent=None):
+    """
+    Returns the Natural Earth geometries for a map, clipped to the map extent and projected to the map projection.
+    The geometries are prepared once and reused for every map with the same extent and projection.
+    :param category: Natural Earth category, e.g. 'physical'
+    :param name: Natural Earth name, e.g. 'land'
+    :param scale: Natural Earth scale, e.g. '10m'
+    :param projection: map projection (cartopy crs)
+    :param extent: optional map extent [min lon, max lon, min lat, max lat]
+    :return: list of projected geometries
+    """
+    key = (category, name, scale, projection.proj4_init, tuple(extent) if extent else None)
+    if key not in base_layers:
+        feature = cfeature.NaturalEarthFeature(category, name, scale)
+        if extent:
+            # clip a little outside of the extent so the edges of the map aren't affected
+            clip = sgeom.box(extent[0], extent[2], extent[1], extent[3]).buffer(1)
+            geoms = [g.intersection(clip) for g in feature.intersecting_geometries(clip.bounds[0::2] +
+                                                                                   clip.bounds[1::2])]
+        else:
+            geoms = feature.geometries()
+        geoms = [projection.project_geometry(g, feature.crs) for g in geoms if not g.is_empty]
+        base_layers[key] = [g for g in geoms if not g.is_empty]
+
+    return base_layers[key]
+
+
+def bathymetry_layer(bath_file, extent=None, npoints=None):
+    """
+    Returns the filled bathymetry contours for a map. The bathymetry is read from the tile store at the resolution
+    needed for the map, contoured once and reused for every map with the same extent.
+    :param bath_file: bathymetry file
+    :param extent: optional map extent [min lon, max lon, min lat, max lat]
+    :param npoints: optional number of points needed across the map, default is the full resolution
+    :return: list of (paths, facecolor) for each contour level, in longitude/latitude
+    """
+    key = ('bathymetry', bath_file, tuple(extent) if extent else None, npoints)
+    if key not in base_layers:
+        #lon_lim = [-100.0, 0]
+        lon_lim = [-100.0, -10.0]
+        lat_lim = [0.0, 60.0]
+        if extent:
+            # only contour the bathymetry on the map (with a small margin)
+            lon_lim = [np.maximum(lon_lim[0], extent[0] - 1), np.minimum(lon_lim[-1], extent[1] + 1)]
+            lat_lim = [np.maximum(lat_lim[0], extent[2] - 1), np.minimum(lat_lim[-1], extent[3] + 1)]
+
+        bath_lonsub, bath_latsub, bath_elevsub = bathymetry.return_bathymetry(bath_file, lon_lim + lat_lim, npoints)
+
+        # contour on an offscreen figure, then keep the contour paths and colors
+        lev = np.arange(-9000, 9100, 100)
+        cs = Figure().subplots().contourf(bath_lonsub, bath_latsub, bath_elevsub, lev, cmap=cmocean.cm.topo)
+        if hasattr(cs, 'collections'):  # matplotlib < 3.8
+            layers = [(c.get_paths(), c.get_facecolor()) for c in cs.collections]
+        else:
+            layers = [([p], fc) for p, fc in zip(cs.get_paths(), cs.get_facecolor())]
+        base_layers[key] = [(paths, fc) for paths, fc in layers if len(paths) > 0]
+
+    return base_layers[key]
+
+
+def add_map_features(axis, axes_limits=None, xlocs=None, landcolor=None, ecolor=None, bath_file=None, bath_dpi=300):
     """
     Adds latitude and longitude gridlines and labels, coastlines, and optional bathymetry to a cartopy map
     object
@@ -24,6 +90,8 @@ def add_map_features(axis, axes_limits=None, xlocs=None, landcolor=None, ecolor=
     :param landcolor: optional land color, default is none
     :param ecolor: optional edge color, default is black
     :param bath_file: optional bathymetry file
+    :param bath_dpi: optional resolution (dpi) of the saved figure, used to read the bathymetry at the resolution
+    needed, default is 300
     """
     gl = axis.gridlines(draw_labels=True, linewidth=.5, color='gray', alpha=0.5, linestyle='dotted', x_inline=False)
     gl.top_labels = False
@@ -40,8 +108,6 @@ def add_map_features(axis, axes_limits=None, xlocs=None, landcolor=None, ecolor=
     if axes_limits:
         axis.set_extent(axes_limits)
 
-    land = cfeature.NaturalEarthFeature('physical', 'land', '10m')
-
     if landcolor is not None:
         lc = landcolor
     else:
@@ -52,34 +118,22 @@ def add_map_features(axis, axes_limits=None, xlocs=None, landcolor=None, ecolor=
     else:
         ec = 'black'
 
-    axis.add_feature(land, edgecolor=ec, facecolor=lc)
+    # the land, coastline and border geometries are prepared once for each map extent and projection
+    land = map_layer('physical', 'land', '10m', axis.projection, axes_limits)
+    axis.add_geometries(land, axis.projection, edgecolor=ec, facecolor=lc)
 
-    coast = cfeature.NaturalEarthFeature('physical', 'coastline', '10m')
-    axis.add_feature(coast, edgecolor='black', facecolor='none')
+    coast = map_layer('physical', 'coastline', '10m', axis.projection, axes_limits)
+    axis.add_geometries(coast, axis.projection, edgecolor='black', facecolor='none')
 
-    axis.add_feature(cfeature.BORDERS)
+    borders = map_layer('cultural', 'admin_0_boundary_lines_land', '110m', axis.projection, axes_limits)
+    axis.add_geometries(borders, axis.projection, edgecolor='black', facecolor='none')
 
     # add optional bathymetry
     if bath_file:
-        ncbath = xr.open_dataset(bath_file)
-        bath_lat = ncbath.variables['lat'][:]
-        bath_lon = ncbath.variables['lon'][:]
-        bath_elev = ncbath.variables['elevation'][:]
-
-        #lon_lim = [-100.0, 0]
-        lon_lim = [-100.0, -10.0]
-        lat_lim = [0.0, 60.0]
-
-        oklatbath = np.logical_and(bath_lat >= lat_lim[0], bath_lat <= lat_lim[-1])
-        oklonbath = np.logical_and(bath_lon >= lon_lim[0], bath_lon <= lon_lim[-1])
-
-        bath_latsub = bath_lat[oklatbath]
-        bath_lonsub = bath_lon[oklonbath]
-        bath_elevs = bath_elev[oklatbath, :]
-        bath_elevsub = bath_elevs[:, oklonbath]
-
-        lev = np.arange(-9000, 9100, 100)
-        axis.contourf(bath_lonsub, bath_latsub, bath_elevsub, lev, cmap=cmocean.cm.topo)
+        npoints = int(axis.get_position().width * axis.figure.get_figwidth() * bath_dpi)
+        for paths, fc in bathymetry_layer(bath_file, axes_limits, npoints):
+            axis.add_collection(PathCollection(paths, facecolors=fc, edgecolors='none', linewidths=0,
+                                               transform=ccrs.PlateCarree()), autolim=False)
 
 
 def hurricane_intensity_cmap(categories):
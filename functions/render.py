@@ -0,0 +1,70 @@
+#! /usr/bin/env python3
+
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def figure_job(func, savefile, inputs=None, **kwargs):
+    """
+    Defines a figure to render. The data should already be prepared, func only draws and saves the figure.
+    :param func: plotting function defined at the top level of a module, called as func(savefile, **kwargs)
+    :param savefile: full file path of the output figure
+    :param inputs: optional list of input files, the figure is re-rendered if any are newer than the figure
+    :param kwargs: arguments passed to func (data, labels, etc.)
+    :return: dictionary describing the figure job
+    """
+    return dict(func=func, savefile=savefile, inputs=inputs or [], kwargs=kwargs)
+
+
+def is_current(savefile, inputs):
+    """
+    Checks if a figure exists and is newer than all of its input files
+    :param savefile: full file path of the figure
+    :param inputs: list of input files
+    """
+    if not os.path.isfile(savefile):
+        return False
+    input_times = [os.path.getmtime(f) for f in inputs if os.path.isfile(f)]
+    return len(input_times) == 0 or os.path.getmtime(savefile) >= max(input_times)
+
+
+def render_job(job):
+    import matplotlib
+    matplotlib.use('Agg')  # no display in the worker processes
+    job['func'](job['savefile'], **job['kwargs'])
+    return job['savefile']
+
+
+def run_jobs(jobs, workers=None, force=False):
+    """
+    Renders figures in parallel in a pool of processes. Figures that are newer than their inputs are skipped.
+    :param jobs: list of jobs from figure_job
+    :param workers: optional number of processes, default is the number of CPUs. Use 1 to render in this process
+    :param force: optional, True renders every figure even if it is current, default is False
+    :return: list of the figures that were rendered
+    """
+    todo = [j for j in jobs if force or not is_current(j['savefile'], j['inputs'])]
+    if len(todo) < len(jobs):
+        print('Skipping {} figures that are up to date'.format(len(jobs) - len(todo)))
+
+    rendered = []
+    if workers == 1:
+        for job in todo:
+            try:
+                rendered.append(render_job(job))
+            except Exception as err:
+                print('Unable to render {}: {}'.format(job['savefile'], err))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(render_job, job): job['savefile'] for job in todo}
+            for f in as_completed(futures):
+                try:
+                    rendered.append(f.result())
+                except Exception as err:
+                    print('Unable to render {}: {}'.format(futures[f], err))
+
+    return rendered
@@ -2,13 +2,22 @@
 
 """
 Author: Lori Garzio on 2/24/2021
-Last modified: 3/29/2021
+Last modified: 10/17/2026
 """
 import os
+import re
+import time
 import numpy as np
 import xarray as xr
 import datetime as dt
 import pandas as pd
+import functions.common as cf
+import functions.spatial as spatial
+import functions.handles as handles
+import functions.cache as cache
+
+rtofs_dirs = {'RTOFS': '/Users/garzio/Documents/rucool/hurricane_glider_project/RTOFS/RTOFS_6hourly_North_Atlantic',
+              'RTOFSDA': '/Users/garzio/Documents/rucool/hurricane_glider_project/RTOFS-DA'}
 
 # RTOFS folder
 # folder_RTOFS = '/home/coolgroup/RTOFS/forecasts/domains/hurricanes/RTOFS_6hourly_North_Atlantic'  # on server
@@ -18,50 +27,218 @@ import pandas as pd
 # folder_RTOFS_DA = '/home/lgarzio/hurricane_gliders/RTOFS_DA/data'  # on server
 # folder_RTOFS_DA = '/Users/garzio/Documents/rucool/hurricane_glider_project/RTOFS-DA'  # on local machine
 
+# file catalogs that have already been loaded, keyed by directory
+catalogs = dict()
+catalog_refresh = 60  # seconds between checks of the directory for new model cycles
+rtofs_file_pattern = r'rtofs_glo_3dz_f(\d{3})_6hrly_hvr_US_east\.nc$'  # 6-hourly 3D files, other products are ignored
+max_file_offset = dt.timedelta(hours=6)  # maximum time between a requested time and the closest file
+
 
-def get_files(start_time, end_time, model):
-    if model == 'RTOFS':
-        rtofs_dir = '/Users/garzio/Documents/rucool/hurricane_glider_project/RTOFS/RTOFS_6hourly_North_Atlantic'
-    elif model == 'RTOFSDA':
-        rtofs_dir = '/Users/garzio/Documents/rucool/hurricane_glider_project/RTOFS-DA'
+def scan_cycle(rtofs_dir, cycle):
+    """
+    Returns the files in one RTOFS model cycle directory
+    :param rtofs_dir: RTOFS or RTOFS-DA directory
+    :param cycle: cycle directory name, e.g. rtofs.20200825
+    :return: list of dictionaries with the cycle, forecast hour, valid time and file (relative to rtofs_dir)
+    """
+    cycle_time = dt.datetime.strptime(cycle.split('.')[-1], '%Y%m%d')
+    rows = []
+    for entry in os.scandir(os.path.join(rtofs_dir, cycle)):
+        match = re.match(rtofs_file_pattern, entry.name)
+        if match:
+            fhour = int(match.group(1))
+            rows.append(dict(cycle=cycle, fhour=fhour, valid_time=cycle_time + dt.timedelta(hours=fhour),
+                             file=os.path.join(cycle, entry.name)))
+    return rows
+
+
+def refresh_catalog(rtofs_dir, catalog):
+    """
+    Updates a file catalog with the model cycles that are new or have changed since the catalog was built, and
+    removes cycles that are no longer in the directory
+    :param rtofs_dir: RTOFS or RTOFS-DA directory
+    :param catalog: catalog dataframe (may be empty)
+    :return: updated catalog dataframe and True if the catalog changed
+    """
+    known = catalog.groupby('cycle')['cycle_mtime'].max().to_dict() if len(catalog) > 0 else dict()
+    cycles = dict()
+    if os.path.isdir(rtofs_dir):
+        for entry in os.scandir(rtofs_dir):
+            if entry.is_dir() and re.match(r'rtofs\.\d{8}$', entry.name):
+                cycles[entry.name] = entry.stat().st_mtime
+
+    rescan = [c for c, mtime in cycles.items() if c not in known or mtime > known[c]]
+    removed = [c for c in known.keys() if c not in cycles]
+    if len(rescan) == 0 and len(removed) == 0:
+        return catalog, False
+
+    rows = []
+    for cycle in rescan:
+        for row in scan_cycle(rtofs_dir, cycle):
+            row['cycle_mtime'] = cycles[cycle]
+            rows.append(row)
+    new = pd.DataFrame(rows, columns=['cycle', 'fhour', 'valid_time', 'file', 'cycle_mtime'])
+    keep = catalog[~catalog['cycle'].isin(rescan + removed)]
+    if len(new) == 0:
+        new = keep.reset_index(drop=True)
+    elif len(keep) > 0:
+        new = pd.concat([keep, new], ignore_index=True)
+
+    return new, True
+
+
+def return_catalog(model):
+    """
+    Returns the catalog of available files for a model. The catalog is saved in the model directory, and new model
+    cycles are added when they arrive. When more than one file is valid at the same time, the file with the
+    shortest forecast (excluding f000) is used, e.g. f024 from the previous day at 00Z.
+    :param model: model (RTOFS or RTOFSDA)
+    :return: dictionary with keys: df (all files), times (sorted valid times) and files (full paths for each time)
+    """
+    rtofs_dir = rtofs_dirs[model]
+    entry = catalogs.get(rtofs_dir)
+    if entry and time.time() - entry['checked'] < catalog_refresh:
+        return entry
+
+    # the catalog is saved in the model directory, or in the local cache if the model directory is read-only
+    catalog_files = [os.path.join(rtofs_dir, 'rtofs_catalog.parquet'),
+                     os.path.join(cache.cache_dir, model, 'rtofs_catalog.parquet')]
+    existing = [f for f in catalog_files if os.path.isfile(f)]
+    if entry:
+        df = entry['df']
+    elif len(existing) > 0:
+        df = pd.read_parquet(max(existing, key=os.path.getmtime))
     else:
-        print('No valid model provided')
-    #file_hours = [6, 12, 18, 24]
-    file_list = []
+        df = pd.DataFrame(columns=['cycle', 'fhour', 'valid_time', 'file', 'cycle_mtime'])
+
+    df, changed = refresh_catalog(rtofs_dir, df)
+    if changed:
+        for catalog_file in catalog_files:
+            try:
+                os.makedirs(os.path.dirname(catalog_file), exist_ok=True)
+                df.to_parquet(catalog_file, index=False)
+                print('\nUpdated {} file catalog: {}'.format(model, catalog_file))
+                break
+            except OSError:
+                print('Unable to save {} file catalog: {}'.format(model, catalog_file))
+
+    files = df.assign(analysis=df['fhour'] == 0).sort_values(['valid_time', 'analysis', 'fhour'])
+    files = files.drop_duplicates('valid_time')
+    catalogs[rtofs_dir] = dict(df=df, times=files['valid_time'].values.astype('datetime64[ns]'),
+                               files=np.array([os.path.join(rtofs_dir, f) for f in files['file']]),
+                               checked=time.time())
+
+    return catalogs[rtofs_dir]
+
+
+def nearest_files(times, model, max_offset=None):
+    """
+    Returns the available RTOFS file closest to each time from the file catalog
+    :param times: array of times (datetime)
+    :param model: model (RTOFS or RTOFSDA)
+    :param max_offset: optional maximum time between a time and its file (timedelta), default is max_file_offset
+    :return: array of file paths, empty strings where there isn't a file within max_offset
+    """
+    if model not in rtofs_dirs:
+        raise ValueError('No valid model provided: {}'.format(model))
+    if max_offset is None:
+        max_offset = max_file_offset
+    catalog = return_catalog(model)
+    times = np.array(pd.to_datetime(np.atleast_1d(times)), dtype='datetime64[ns]')
+    if len(catalog['times']) == 0:
+        return np.full(len(times), '', dtype=object)
+
+    ctimes = catalog['times']
+    hi = np.clip(np.searchsorted(ctimes, times), 0, len(ctimes) - 1)
+    lo = np.maximum(hi - 1, 0)
+    idx = np.where(abs(times - ctimes[lo]) <= abs(ctimes[hi] - times), lo, hi)
+    ok = abs(ctimes[idx] - times) <= np.timedelta64(max_offset)
+
+    return np.where(ok, catalog['files'][idx].astype(object), '')
+
+
+def get_files(start_time, end_time, model, max_offset=None):
+    """
+    Returns the available RTOFS files for a time or time range from the file catalog
+    :param start_time: start time (datetime)
+    :param end_time: end time (datetime)
+    :param model: model (RTOFS or RTOFSDA)
+    :param max_offset: optional maximum time between the requested times and the files (timedelta), default is
+    max_file_offset
+    :return: list with the file closest to start_time if start_time == end_time, otherwise all of the files that
+    cover the time range
+    """
+    if model not in rtofs_dirs:
+        raise ValueError('No valid model provided: {}'.format(model))
+    if max_offset is None:
+        max_offset = max_file_offset
     if end_time - start_time == dt.timedelta(0):
-        t1 = start_time - dt.timedelta(days=1)
-        t0 = start_time + dt.timedelta(days=1)
-        daterange = pd.date_range(dt.date(t1.year, t1.month, t1.day), dt.date(t0.year, t0.month, t0.day), freq='6H')
-        d_idx = np.argmin([abs(dr - start_time) for dr in daterange])  # find the closest file to the time of interest
-        ts = daterange[d_idx]
-        if ts.hour == 0:
-            tmstr = (ts - dt.timedelta(days=1)).strftime('%Y%m%d')
-            hourstr = '024'
-        else:
-            tmstr = ts.strftime('%Y%m%d')
-            hourstr = '{:03d}'.format(ts.hour)
-        # fh_idx = np.argmin([abs(fh - start_time.hour) for fh in file_hours])
-        fname = os.path.join(rtofs_dir, 'rtofs.{}'.format(tmstr),
-                             'rtofs_glo_3dz_f{}_6hrly_hvr_US_east.nc'.format(hourstr))
-        file_list.append(fname)
+        # find the closest file to the time of interest
+        file_list = [f for f in nearest_files([start_time], model, max_offset) if f]
     else:
-        print('figure out how to grab multiple files')
+        # all of the files that cover the time range, including the files just before and after the range
+        catalog = return_catalog(model)
+        times = catalog['times']
+        t0 = np.datetime64(pd.Timestamp(start_time))
+        t1 = np.datetime64(pd.Timestamp(end_time))
+        lo = np.maximum(np.searchsorted(times, t0, side='right') - 1, 0)
+        hi = np.searchsorted(times, t1, side='left')
+        idx = np.arange(lo, np.minimum(hi + 1, len(times)))
+        ok = np.logical_and(times[idx] >= t0 - np.timedelta64(max_offset),
+                            times[idx] <= t1 + np.timedelta64(max_offset))
+        file_list = list(catalog['files'][idx[ok]])
+
+    if len(file_list) == 0:
+        raise FileNotFoundError('No {} files within {} of {} to {} in {}'.format(model, max_offset, start_time,
+                                                                                 end_time, rtofs_dirs[model]))
 
     return file_list
 
 
+def open_files(filenames):
+    """
+    Opens one RTOFS file, or lazily opens multiple files as one dataset concatenated along the time dimension (MT).
+    The datasets are kept open in the process-wide dataset pool, so repeated calls for the same files reuse them.
+    :param filenames: list of file paths
+    :return: xarray dataset
+    """
+    def opener():
+        if len(filenames) == 1:
+            ds = xr.open_dataset(filenames[0])
+        else:
+            # the files share the same grid, so only concatenate the variables with a time dimension
+            ds = xr.open_mfdataset(filenames, combine='nested', concat_dim='MT', data_vars='minimal',
+                                   coords='minimal', compat='override', parallel=True)
+        ds = ds.drop('Date')  # drop unnecessary coordinates
+        return ds
+
+    return handles.get_dataset(('RTOFS', tuple(filenames)), opener)
+
+
+def return_grid(filenames):
+    """
+    Returns the 2D latitude and longitude arrays of RTOFS files, read once while the files are in the dataset pool
+    :param filenames: list of file paths
+    :return: latitude and longitude arrays
+    """
+    key = ('RTOFS', tuple(filenames))
+    ds = open_files(filenames)
+    lat = handles.get_values(key, ds, 'Latitude')
+    lon = handles.get_values(key, ds, 'Longitude')
+
+    return lat, lon
+
+
 def return_gridded_ds(varname, start_time, end_time, coordlims, model, depth_slice=None):
     filenames = get_files(start_time, end_time, model)
-    ds = xr.open_dataset(filenames[0])
-    ds = ds.drop('Date')  # drop unnecessary coordinates
+    ds = open_files(filenames)
 
-    lon = ds.Longitude.values
-    lat = ds.Latitude.values
+    lat, lon = return_grid(filenames)
 
     if depth_slice:
-        ds_var = np.squeeze(ds[varname].sel(Depth=slice(depth_slice[0], depth_slice[1])))
+        ds_var = ds[varname].sel(Depth=slice(depth_slice[0], depth_slice[1]))
     else:
-        ds_var = np.squeeze(ds[varname])
+        ds_var = ds[varname]
 
     lon_ind = np.logical_and(lon > coordlims[0], lon < coordlims[1])
     lat_ind = np.logical_and(lat > coordlims[2], lat < coordlims[3])
@@ -70,8 +247,8 @@ def return_gridded_ds(varname, start_time, end_time, coordlims, model, depth_sli
     ind = np.where(np.logical_and(lon_ind, lat_ind))
 
     # subset data from min i,j lat/lon corner to max i,j lat/lon corner
-    vardata = np.squeeze(ds_var)[:, range(np.min(ind[0]), np.max(ind[0]) + 1),
-                                 range(np.min(ind[1]), np.max(ind[1]) + 1)]
+    vardata = np.squeeze(ds_var.isel(Y=slice(np.min(ind[0]), np.max(ind[0]) + 1),
+                                     X=slice(np.min(ind[1]), np.max(ind[1]) + 1)))
 
     return vardata
 
@@ -79,23 +256,77 @@ def return_gridded_ds(varname, start_time, end_time, coordlims, model, depth_sli
 def return_point(varname, start_time, end_time, target_lon, target_lat, model):
     filenames = get_files(start_time, end_time, model)
 
-    ds = xr.open_dataset(filenames[0])
-    ds = ds.drop('Date')  # drop unnecessary coordinates
-    lat = ds.Latitude.values
-    lon = ds.Longitude.values
+    ds = open_files(filenames)
+    lat, lon = return_grid(filenames)
 
-    # Find the closest model point
-    # calculate the sum of the absolute value distance between the model location and selected profile location
-    a = abs(lat - target_lat) + abs(lon - target_lon)
+    # Find the closest model point using the grid index saved in the RTOFS directory
+    rtofs_dir = os.path.dirname(os.path.dirname(filenames[0]))
+    (i, j), distance = spatial.nearest_grid_point(lon, lat, target_lon, target_lat, rtofs_dir)
 
-    # find the indices of the minimum value in the array calculated above
-    i, j = np.unravel_index(a.argmin(), a.shape)
-
-    target_ds = np.squeeze(ds[varname])[:, i, j]
+    target_ds = np.squeeze(ds[varname].isel(Y=i, X=j))
 
     return target_ds
 
 
+def return_points(varnames, times, target_lons, target_lats, model):
+    """
+    Returns RTOFS profiles at many locations and times. Each RTOFS file is opened once, and the profiles from each
+    file are grabbed in one read.
+    :param varnames: list of variable names
+    :param times: array of times (datetime)
+    :param target_lons: array of longitudes
+    :param target_lats: array of latitudes
+    :param model: model (RTOFS or RTOFSDA)
+    :return: dictionary of xarray DataArrays with dims (point, Depth) for each variable. Points without a file close
+    to their time are nan, and FileNotFoundError is raised if there aren't files for any of the points
+    """
+    times = pd.to_datetime(np.atleast_1d(times))
+    target_lons = np.atleast_1d(target_lons)
+    target_lats = np.atleast_1d(target_lats)
+
+    # the file closest to each target time, empty where there isn't a file close to the time
+    point_files = nearest_files(times, model)
+
+    data = dict()
+    model_time = np.empty(len(times), dtype='datetime64[ns]')
+    model_time[:] = np.datetime64('NaT')
+    model_lon = np.full(len(times), np.nan)
+    model_lat = np.full(len(times), np.nan)
+    depth = None
+    for fname in np.unique(point_files):
+        idx = point_files == fname
+        if not fname:
+            print('No {} file within {} of {} points'.format(model, max_file_offset, np.sum(idx)))
+            continue
+
+        ds = open_files([fname])
+        lat, lon = return_grid([fname])
+        (i, j), distance = spatial.nearest_grid_point(lon, lat, target_lons[idx], target_lats[idx],
+                                                      os.path.dirname(os.path.dirname(fname)))
+        model_time[idx] = ds.MT.values[0]
+        model_lon[idx] = lon[i, j]
+        model_lat[idx] = lat[i, j]
+        if depth is None:
+            depth = ds.Depth.values
+
+        for varname in varnames:
+            if varname not in data:
+                data[varname] = np.full((len(times), len(depth)), np.nan)
+            data[varname][idx, :] = cf.gather_columns(ds[varname][0], i, j, 'Y', 'X').T
+
+    if depth is None:
+        raise FileNotFoundError('No {} files within {} of any of the {} point times ({} to {})'.format(
+            model, max_file_offset, len(times), times.min(), times.max()))
+
+    for varname in data.keys():
+        data[varname] = xr.DataArray(data[varname], dims=['point', 'Depth'],
+                                     coords=dict(Depth=depth, time=('point', model_time),
+                                                 Longitude=('point', model_lon), Latitude=('point', model_lat)),
+                                     name=varname)
+
+    return data
+
+
 def return_surface_variable(varname, start_time, end_time, coordlims, model, depth):
     """
     :param varname: variable name
@@ -106,12 +337,10 @@ def return_surface_variable(varname, start_time, end_time, coordlims, model, dep
     """
     filenames = get_files(start_time, end_time, model)
 
-    ds = xr.open_dataset(filenames[0])
-    ds = ds.drop('Date')  # drop unnecessary coordinates
-    lat = ds.Latitude.values
-    lon = ds.Longitude.values
+    ds = open_files(filenames)
+    lat, lon = return_grid(filenames)
 
-    ds_surface = np.squeeze(ds[varname].sel(Depth=depth))
+    ds_surface = ds[varname].sel(Depth=depth)
     lon_ind = np.logical_and(lon > coordlims[0], lon < coordlims[1])
     lat_ind = np.logical_and(lat > coordlims[2], lat < coordlims[3])
 
@@ -119,8 +348,8 @@ def return_surface_variable(varname, start_time, end_time, coordlims, model, dep
     ind = np.where(np.logical_and(lon_ind, lat_ind))
 
     # subset data from min i,j lat/lon corner to max i,j lat/lon corner
-    ds_surface = np.squeeze(ds_surface)[range(np.min(ind[0]), np.max(ind[0]) + 1),
-                                        range(np.min(ind[1]), np.max(ind[1]) + 1)]
+    ds_surface = np.squeeze(ds_surface.isel(Y=slice(np.min(ind[0]), np.max(ind[0]) + 1),
+                                            X=slice(np.min(ind[1]), np.max(ind[1]) + 1)))
 
     return ds_surface
 
@@ -128,10 +357,8 @@ def return_surface_variable(varname, start_time, end_time, coordlims, model, dep
 def return_transect(varname, start_time, end_time, target_lons, target_lats, model):
     filenames = get_files(start_time, end_time, model)
 
-    ds = xr.open_dataset(filenames[0])
-    ds = ds.drop('Date')  # drop unnecessary coordinates
-    lat = ds.Latitude.values
-    lon = ds.Longitude.values
+    ds = open_files(filenames)
+    lat, lon = return_grid(filenames)
 
     # find the RTOFS lat/lon indicies closest to the lats/lons provided
     lon_idx = np.round(np.interp(target_lons, lon[0, :], np.arange(0, len(lon[0, :])))).astype(int)
@@ -141,12 +368,10 @@ def return_transect(varname, start_time, end_time, target_lons, target_lats, mod
     lat_subset = lat[lat_idx, 0]
 
     depth = ds.Depth.values
-    # target_var = ds.variables[varname][:, lat_idx, lon_idx]
-    target_var = np.empty((len(depth), len(lon_idx)))
-    target_var[:] = np.nan
 
-    for pos in range(len(lon_idx)):
-        print(len(lon_idx), pos)
-        target_var[:, pos] = ds.variables[varname][0, :, lat_idx[pos], lon_idx[pos]]
+    # grab all of the columns along the transect in one read, dims are (time, depth, position)
+    target_var = cf.gather_columns(ds[varname], lat_idx, lon_idx, 'Y', 'X')
+    if len(filenames) == 1:
+        target_var = target_var[0]
 
     return target_var, depth, lon_subset, lat_subset
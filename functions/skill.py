@@ -0,0 +1,65 @@
+#! /usr/bin/env python3
+
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+"""
+import numpy as np
+import pandas as pd
+import functions.common as cf
+
+
+def in_window(times, start_time, end_time):
+    """
+    Finds the times in a comparison window. The window includes the start time and excludes the end time, so
+    consecutive windows don't share a profile.
+    :param times: array of times
+    :param start_time: start of the window (datetime)
+    :param end_time: end of the window (datetime)
+    :return: boolean array
+    """
+    times = pd.to_datetime(np.asarray(times))
+    return np.logical_and(times >= pd.Timestamp(start_time), times < pd.Timestamp(end_time))
+
+
+def compare_profiles(observed, modeled, depth, max_depth=None):
+    """
+    Calculates bias and root mean square error between observed and modeled profiles on the same depth levels
+    :param observed: array of observed profiles with shape (profile, depth), e.g. binned glider data
+    :param modeled: array of modeled profiles with shape (profile, depth)
+    :param depth: 1D array of depths
+    :param max_depth: optional maximum depth (m) included in the statistics
+    :return: dictionary containing arrays of bias (model - observed), rmse and the number of levels compared (n)
+    """
+    diff = np.asarray(modeled, dtype=float) - np.asarray(observed, dtype=float)
+    if max_depth:
+        diff[:, np.asarray(depth) > max_depth] = np.nan
+
+    n = np.sum(~np.isnan(diff), axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bias = np.nansum(diff, axis=1) / n
+        rmse = np.sqrt(np.nansum(diff ** 2, axis=1) / n)
+
+    return dict(bias=bias, rmse=rmse, n=n)
+
+
+def compare_metrics(observed_temp, modeled_temp, depth):
+    """
+    Calculates mixed layer depth and OHC for observed and modeled temperature profiles on the same depth levels.
+    Model levels without observations are ignored.
+    :param observed_temp: array of observed temperature profiles with shape (profile, depth)
+    :param modeled_temp: array of modeled temperature profiles with shape (profile, depth)
+    :param depth: 1D array of depths
+    :return: dictionary with keys mld and ohc, each containing arrays of observed, modeled and difference
+    (model - observed)
+    """
+    # only use the model levels that have observations, so both are integrated over the same depths
+    modeled_temp = np.where(np.isnan(observed_temp), np.nan, modeled_temp)
+
+    metrics = dict()
+    for name, func in {'mld': cf.mld_temperature, 'ohc': cf.ohc_integrate}.items():
+        obs = func(observed_temp, depth, axis=1)
+        mod = func(modeled_temp, depth, axis=1)
+        metrics[name] = dict(observed=obs, modeled=mod, difference=mod - obs)
+
+    return metrics
@@ -0,0 +1,136 @@
+#! /usr/bin/env python3
+
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+"""
+import os
+import pickle
+import hashlib
+import weakref
+import numpy as np
+from scipy.spatial import cKDTree
+
+earth_radius = 6371.0  # km
+
+# spatial indices that have already been built or loaded, keyed by grid hash
+grid_indices = dict()
+
+# grid hashes of the lon/lat arrays that have already been seen, keyed by array ids. Weak references check the
+# arrays are the same objects, so the pooled RTOFS Latitude/Longitude arrays are only hashed once.
+grid_keys = dict()
+
+
+def lonlat_to_xyz(lon, lat):
+    """
+    Converts longitude and latitude to cartesian coordinates on the unit sphere. The straight-line distance between
+    two points on the sphere increases with the great circle distance, so the nearest neighbor in xyz is the nearest
+    neighbor on the earth.
+    :param lon: array of longitudes (degrees)
+    :param lat: array of latitudes (degrees)
+    :return: array of x, y, z with shape (n, 3)
+    """
+    lon = np.radians(np.asarray(lon, dtype=float).ravel())
+    lat = np.radians(np.asarray(lat, dtype=float).ravel())
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def grid_hash(lon, lat):
+    """
+    Returns a hash string that identifies a model grid
+    :param lon: array of grid longitudes
+    :param lat: array of grid latitudes
+    """
+    lon = np.ascontiguousarray(lon)
+    lat = np.ascontiguousarray(lat)
+    h = hashlib.sha1('{} {} {}'.format(lon.shape, lon.dtype, lat.dtype).encode('utf-8'))
+    h.update(lon.tobytes())
+    h.update(lat.tobytes())
+    return h.hexdigest()
+
+
+def return_grid_key(lon, lat):
+    """
+    Returns the grid hash of lon/lat arrays, hashing each pair of arrays only the first time it is seen. The arrays
+    must not be modified after they are used.
+    :param lon: array of grid longitudes
+    :param lat: array of grid latitudes
+    """
+    ids = (id(lon), id(lat))
+    entry = grid_keys.get(ids)
+    if entry is not None and entry[0]() is lon and entry[1]() is lat:
+        return entry[2]
+
+    key = grid_hash(lon, lat)
+    try:
+        refs = (weakref.ref(lon), weakref.ref(lat))
+    except TypeError:  # e.g. lists can't be weakly referenced, they are hashed every time
+        return key
+    for k in [k for k, v in grid_keys.items() if v[0]() is None or v[1]() is None]:
+        del grid_keys[k]
+    grid_keys[ids] = refs + (key,)
+
+    return key
+
+
+def load_grid_index(lon, lat, index_dir=None):
+    """
+    Returns a KD-tree for a model grid. The tree is built once per grid and saved to index_dir (if provided) so
+    later runs load it from disk. An index file that can't be read, or doesn't match the grid, is rebuilt.
+    :param lon: array of grid longitudes (1D or 2D)
+    :param lat: array of grid latitudes, same shape as lon
+    :param index_dir: optional directory where the index is saved, e.g. the model data directory
+    :return: scipy.spatial.cKDTree
+    """
+    key = return_grid_key(lon, lat)
+    if key in grid_indices:
+        return grid_indices[key]
+
+    fname = None
+    if index_dir:
+        fname = os.path.join(index_dir, 'grid_index_{}.pkl'.format(key[0:16]))
+
+    tree = None
+    if fname and os.path.isfile(fname):
+        try:
+            with open(fname, 'rb') as f:
+                tree = pickle.load(f)
+            if not isinstance(tree, cKDTree) or tree.n != np.size(lon):
+                raise ValueError('index does not match the grid')
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError) as err:
+            print('Rebuilding grid index {}: {}'.format(fname, err))
+            tree = None
+
+    if tree is None:
+        tree = cKDTree(lonlat_to_xyz(lon, lat))
+        if fname:
+            try:
+                with open(fname, 'wb') as f:
+                    pickle.dump(tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except OSError:
+                print('Unable to save grid index: {}'.format(fname))
+
+    grid_indices[key] = tree
+    return tree
+
+
+def nearest_grid_point(lon, lat, target_lon, target_lat, index_dir=None):
+    """
+    Finds the model grid points closest to target locations
+    :param lon: array of grid longitudes (2D for RTOFS)
+    :param lat: array of grid latitudes, same shape as lon
+    :param target_lon: longitude or array of longitudes
+    :param target_lat: latitude or array of latitudes
+    :param index_dir: optional directory where the grid index is saved
+    :return: tuple of grid indices (one array per grid dimension, e.g. i and j) and the distances in km
+    """
+    tree = load_grid_index(lon, lat, index_dir)
+    chord, idx = tree.query(lonlat_to_xyz(target_lon, target_lat))
+    distance = 2 * earth_radius * np.arcsin(np.minimum(chord / 2, 1))
+    indices = np.unravel_index(idx, np.shape(lon))
+
+    if np.ndim(target_lon) == 0:
+        indices = tuple(i[0] for i in indices)
+        distance = distance[0]
+
+    return indices, distance
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 Author: Lori Garzio on 3/3/2021
-Last modified: Lori Garzio on 3/29/2021
+Last modified: Lori Garzio on 10/17/2026
 """
 
 import os
@@ -12,8 +12,10 @@ from matplotlib import pyplot as plt
 import cmocean as cmo
 import functions.cmems as cmems
 import functions.common as cf
+import functions.ibtracs as ibtracs
 import functions.gofs as gofs
 import functions.rtofs as rtofs
+import functions.render as render
 plt.rcParams.update({'font.size': 14})
 
 
@@ -32,7 +34,25 @@ def plot_xsection(axis, xdata, ydata, cdata, colormap, ttl, ylab, xlab, clab, kw
     axis.set_xlabel(xlab)
 
 
-def main(stime, etime, stm, sDir):
+def plot_transect(savefile, xdata, ydata, cdata, colormap, ttl, clab, levels, ylims=None):
+    fig, ax = plt.subplots(figsize=(12, 6))
+    plot_xsection(ax, xdata, ydata, cdata, colormap, ttl, 'Depth (m)', 'Longitude', clab, dict(levels=levels), ylims)
+    plt.savefig(savefile, dpi=300)
+    plt.close()
+
+
+def plot_ohc(savefile, xdata, ohc, ttl):
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.plot(xdata, ohc)
+    ax.set_ylim(10, 150)
+    plt.title(ttl)
+    ax.set_ylabel(r'($\rmKJ / cm^2$)')
+    ax.set_xlabel('Longitude')
+    plt.savefig(savefile, dpi=300)
+    plt.close()
+
+
+def main(stime, etime, stm, sDir, workers=None, force=False):
     #pltvars = ['temp', 'salt']
     pltvars = ['temp']
     #ylimits = [[0, 300], [0, 500]]
@@ -49,12 +69,12 @@ def main(stime, etime, stm, sDir):
                       'colorticks': np.arange(31.2, 37.2, .2), 'savename': 'sss'}
              }
 
-    # get the IBTrACS dataset
-    # define storm indices in IBTrACS file
-    stm_idx = {'Laura_2020': 276}
+    # get the storm track from the IBTrACS track store (built from the IBTrACS file the first time)
     ib = '/Users/garzio/Documents/rucool/hurricane_glider_project/IBTrACS/IBTrACS.last3years.v04r00.nc'
+    ibstore = ibtracs.return_track_store(ib)
     ibvars = ['time', 'lat', 'lon']
-    ibdata = cf.return_ibtracs_storm(ib, stm_idx[stm], ibvars)
+    stm_name, stm_season = stm.split('_')
+    ibdata = ibtracs.return_storm(ibstore, ibvars, name=stm_name, season=stm_season)
 
     # find the lat/lon index where the storm is in the Gulf of Mexico
     loc_idx = np.logical_and(ibdata['lon'] < -84, ibdata['lat'] < 30)
@@ -63,55 +83,45 @@ def main(stime, etime, stm, sDir):
 
     targetlon, targetlat = cf.return_target_transect(tlon, tlat)
 
+    # prepare the data for each figure, then draw the figures in parallel
+    jobs = []
     for pv in pltvars:
         for model in minfo.keys():
-            for yl in ylimits:
-                if model == 'GOFS':
-                    target_lonGOFS = gofs.convert_target_gofs_lon(targetlon)
-                    m_targetvar, m_depth, m_lon_subset, m_lat_subset = gofs.return_transect(minfo[model][pv], stime,
-                                                                                            etime,
-                                                                                            target_lonGOFS, targetlat)
-                elif model == 'RTOFS':
-                    m_targetvar, m_depth, m_lon_subset, m_lat_subset = rtofs.return_transect(minfo[model][pv], stime,
-                                                                                             etime, targetlon,
-                                                                                             targetlat, 'RTOFS')
-                    #depth_matrix = np.tile(m_depth, (np.shape(m_targetvar)[1], 1)).T
-
-                elif model == 'RTOFSDA':
-                    m_targetvar, m_depth, m_lon_subset, m_lat_subset = rtofs.return_transect(minfo[model][pv], stime,
-                                                                                             etime, targetlon,
-                                                                                             targetlat, 'RTOFSDA')
-
-                fig, ax = plt.subplots(figsize=(12, 6))
-                kw = dict(levels=vinfo[pv]['colorticks'])
+            # check the figures before reading the model transect
+            inputs = rtofs.get_files(stime, etime, model) if model in ['RTOFS', 'RTOFSDA'] else []
+            savefiles = [os.path.join(sDir, '{}_{}_transect_{}_{}m_{}.png'.format(stm, model, pv, yl[1],
+                                                                                 stime.strftime('%Y%m%dT%H')))
+                         for yl in ylimits]
+            ohcfile = os.path.join(sDir, '{}_{}_transect_ohc_{}.png'.format(stm, model, stime.strftime('%Y%m%dT%H')))
+            if pv == 'temp':
+                savefiles.append(ohcfile)
+            if not force and all(render.is_current(sf, inputs) for sf in savefiles):
+                print('Skipping {} {}: figures are up to date'.format(model, pv))
+                continue
+
+            if model == 'GOFS':
+                target_lonGOFS = gofs.convert_target_gofs_lon(targetlon)
+                m_targetvar, m_depth, m_lon_subset, m_lat_subset = gofs.return_transect(minfo[model][pv], stime, etime,
+                                                                                        target_lonGOFS, targetlat)
+            else:
+                m_targetvar, m_depth, m_lon_subset, m_lat_subset = rtofs.return_transect(minfo[model][pv], stime,
+                                                                                         etime, targetlon,
+                                                                                         targetlat, model)
+                #depth_matrix = np.tile(m_depth, (np.shape(m_targetvar)[1], 1)).T
+
+            for yl, savefile in zip(ylimits, savefiles):
                 plt_ttl = '{} Transect on {}'.format(model, stime.strftime('%Y-%m-%d %H:%M'))
-                ylabel = 'Depth (m)'
-                xlabel = 'Longitude'
-                clabel = vinfo[pv]['label']
-                color = vinfo[pv]['cmap']
-                plot_xsection(ax, m_lon_subset, m_depth, m_targetvar, color, plt_ttl, ylabel, xlabel, clabel, kw, yl)
-
-                savefile = os.path.join(sDir, '{}_{}_transect_{}_{}m_{}.png'.format(stm, model, pv, yl[1],
-                                                                                    stime.strftime('%Y%m%dT%H')))
-
-                #plt.savefig(savefile, dpi=300)
-                #plt.close()
-
-                if pv == 'temp':
-                    # plot OHC
-                    ohc = cf.ohc_surface_2d(m_targetvar.T, m_depth)
-                    fig, ax = plt.subplots(figsize=(12, 6))
-                    ax.plot(m_lon_subset, ohc)
-                    ax.set_ylim(10, 150)
-                    plt_ttl = '{} OHC (integrated to 26C) on {}'.format(model, stime.strftime('%Y-%m-%d %H:%M'))
-                    plt.title(plt_ttl)
-                    ax.set_ylabel(r'($\rmKJ / cm^2$)')
-                    ax.set_xlabel(xlabel)
-
-                    savefile = os.path.join(sDir, '{}_{}_transect_ohc_{}.png'.format(stm, model,
-                                                                                     stime.strftime('%Y%m%dT%H')))
-                    plt.savefig(savefile, dpi=300)
-                    plt.close()
+                jobs.append(render.figure_job(plot_transect, savefile, inputs, xdata=m_lon_subset, ydata=m_depth,
+                                              cdata=m_targetvar, colormap=vinfo[pv]['cmap'], ttl=plt_ttl,
+                                              clab=vinfo[pv]['label'], levels=vinfo[pv]['colorticks'], ylims=yl))
+
+            if pv == 'temp':
+                # plot OHC
+                ohc = cf.ohc_surface_2d(m_targetvar.T, m_depth)
+                plt_ttl = '{} OHC (integrated to 26C) on {}'.format(model, stime.strftime('%Y-%m-%d %H:%M'))
+                jobs.append(render.figure_job(plot_ohc, ohcfile, inputs, xdata=m_lon_subset, ohc=ohc, ttl=plt_ttl))
+
+    render.run_jobs(jobs, workers, force)
 
 
 if __name__ == '__main__':
@@ -121,5 +131,6 @@ if __name__ == '__main__':
     #end_time = dt.datetime(2020, 8, 28, 12)
     storm_name = 'Laura_2020'
     save_dir = os.path.join('/Users/garzio/Documents/rucool/hurricane_glider_project', storm_name)
-    main(start_time, end_time, storm_name, save_dir)
+    nworkers = 4  # number of processes used to draw the figures
+    main(start_time, end_time, storm_name, save_dir, nworkers)
 
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Author: Lori Garzio on 10/17/2026
+Last modified: 10/17/2026
+Compare every glider profile in a region and time window to the co-located GOFS, RTOFS and RTOFS-DA profiles and
+save the statistics (bias, RMSE, mixed layer depth and OHC differences) to a parquet table
+"""
+
+import os
+import datetime as dt
+import numpy as np
+import pandas as pd
+import functions.common as cf
+import functions.gliders as gliders
+import functions.binning as binning
+import functions.skill as skill
+import functions.gofs as gofs
+import functions.rtofs as rtofs
+
+
+def main(stime, etime, region, sDir, max_depth=300):
+    lims, xticks = cf.define_region_limits(region)
+    minfo = {'GOFS': {'temp': 'water_temp', 'salt': 'salinity', 'depth': 'depth'},
+             'RTOFS': {'temp': 'temperature', 'salt': 'salinity', 'depth': 'Depth'},
+             'RTOFSDA': {'temp': 'temperature', 'salt': 'salinity', 'depth': 'Depth'}
+             }
+    glinfo = {'temp': 'temperature', 'salt': 'salinity'}
+
+    # find and download glider datasets
+    ioos_server = 'https://data.ioos.us/gliders/erddap'
+    t0_str = stime.strftime('%Y-%m-%dT%H:%M')
+    tf_str = etime.strftime('%Y-%m-%dT%H:%M')
+    kw = {'min_lon': lims[0], 'max_lon': lims[1], 'min_lat': lims[2], 'max_lat': lims[3],
+          'min_time': t0_str, 'max_time': tf_str}
+    gliderids = gliders.return_glider_ids(ioos_server, kw)
+
+    # the comparison window includes stime and excludes etime (skill.in_window)
+    glconstraints = {'time>=': t0_str, 'time<': tf_str, 'latitude>=': lims[2], 'latitude<=': lims[3],
+                     'longitude>=': lims[0], 'longitude<=': lims[1]}
+    glvars = ['time', 'latitude', 'longitude', 'depth', 'temperature', 'salinity']
+    glider_data = gliders.get_erddap_nc_bulk(ioos_server, gliderids, var_list=glvars, constraints=glconstraints)
+
+    # split each glider dataset into profiles, and combine the profiles from all gliders
+    profiles = []
+    rows = {v: [] for v in ['profile', 'depth', 'temperature', 'salinity']}
+    nprofiles = 0
+    for glid, glds in glider_data.items():
+        if glds is None:
+            continue
+        gldata = {v: glds[v].values for v in glvars}
+        glprofiles = gliders.build_profile_index(gldata['time'], gldata['depth'], gldata['latitude'],
+                                                 gldata['longitude'])
+        glprofiles = glprofiles[skill.in_window(glprofiles['time'], stime, etime)].reset_index(drop=True)
+        if len(glprofiles) == 0:
+            continue
+        glprofiles.insert(0, 'glider', glid.split('-')[0])
+        glprofiles.insert(1, 'dataset_id', glid)
+        profiles.append(glprofiles)
+
+        pnum = binning.profile_numbers(glprofiles, len(gldata['time']))
+        rows['profile'].append(np.where(pnum >= 0, pnum + nprofiles, -1))
+        for v in ['depth', 'temperature', 'salinity']:
+            rows[v].append(gldata[v])
+        nprofiles += len(glprofiles)
+
+    if nprofiles == 0:
+        print('No glider profiles found for {} to {}'.format(t0_str, tf_str))
+        return
+
+    profiles = pd.concat(profiles, ignore_index=True)
+    rows = {k: np.concatenate(v) for k, v in rows.items()}
+    ptimes = profiles['time'].dt.to_pydatetime()
+    print('\nComparing {} glider profiles'.format(nprofiles))
+
+    results = []
+    for model in minfo.keys():
+        # get the model profiles at every glider profile (model files are read once for all profiles)
+        varnames = [minfo[model]['temp'], minfo[model]['salt']]
+        if model == 'GOFS':
+            mdata = gofs.return_points(varnames, ptimes, profiles['lon'].values, profiles['lat'].values)
+        else:
+            try:
+                mdata = rtofs.return_points(varnames, ptimes, profiles['lon'].values, profiles['lat'].values, model)
+            except FileNotFoundError as err:
+                print(err)
+                continue
+        depth = mdata[varnames[0]][minfo[model]['depth']].values
+
+        # bin all of the glider profiles to the model depth levels
+        edges = binning.level_bin_edges(depth)
+        glbinned = dict()
+        for pv, glvar in glinfo.items():
+            glbinned[pv], _ = binning.bin_profiles(rows['profile'], rows['depth'], rows[glvar], edges, nprofiles)
+
+        for pv in glinfo.keys():
+            stats = skill.compare_profiles(glbinned[pv], mdata[minfo[model][pv]].values, depth, max_depth)
+            df = profiles[['glider', 'dataset_id', 'profile_id', 'time', 'lon', 'lat']].copy()
+            df['model'] = model
+            df['variable'] = pv
+            df['bias'] = stats['bias']
+            df['rmse'] = stats['rmse']
+            df['n_levels'] = stats['n']
+            results.append(df)
+
+        metrics = skill.compare_metrics(glbinned['temp'], mdata[minfo[model]['temp']].values, depth)
+        for name, m in metrics.items():
+            df = profiles[['glider', 'dataset_id', 'profile_id', 'time', 'lon', 'lat']].copy()
+            df['model'] = model
+            df['variable'] = name
+            df['glider_value'] = m['observed']
+            df['model_value'] = m['modeled']
+            df['difference'] = m['difference']
+            results.append(df)
+
+    results = pd.concat(results, ignore_index=True)
+    savefile = os.path.join(sDir, 'glider_model_skill_{}_{}-{}.parquet'.format(region, stime.strftime('%Y%m%dT%H'),
+                                                                                etime.strftime('%Y%m%dT%H')))
+    results.to_parquet(savefile, index=False)
+    print('\nSaved: {}'.format(savefile))
+
+
+if __name__ == '__main__':
+    start_time = dt.datetime(2020, 8, 22)
+    end_time = dt.datetime(2020, 8, 29)
+    region = 'GoMex'
+    storm_name = 'Laura_2020'
+    save_dir = os.path.join('/Users/garzio/Documents/rucool/hurricane_glider_project', storm_name)
+    main(start_time, end_time, region, save_dir)
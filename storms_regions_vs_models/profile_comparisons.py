@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 Author: Lori Garzio on 3/3/2021
-Last modified: 3/3/2021
+Last modified: 10/17/2026
 """
 
 import os
@@ -32,6 +32,18 @@ def main(stime, etime, stm, sDir, profile_locs):
     xticks1 = {500: {'temp': np.arange(10, 35, 5), 'salt': np.arange(35.2, 37, .2)},
                300: {'temp': np.arange(10, 35, 5), 'salt': np.arange(35.6, 37, .2)}}
 
+    # get the model profiles at all of the locations at once
+    times = np.repeat(stime, len(profile_locs))
+    lons = np.array([pl[0] for pl in profile_locs])
+    lats = np.array([pl[1] for pl in profile_locs])
+    mdata = dict()
+    for model in minfo.keys():
+        varnames = [minfo[model][pv] for pv in pltvars]
+        if model == 'GOFS':
+            mdata[model] = gofs.return_points(varnames, times, lons, lats)
+        else:
+            mdata[model] = rtofs.return_points(varnames, times, lons, lats, model)
+
     for i, pl in enumerate(profile_locs):
         for md in max_depth:
             for pv in pltvars:
@@ -42,22 +54,18 @@ def main(stime, etime, stm, sDir, profile_locs):
 
                 # get GOFS data
                 print('\nPlotting GOFS')
-                target_lonGOFS = gofs.convert_target_gofs_lon(pl[0])
-                GOFS_targetvar = gofs.return_point(minfo['GOFS'][pv], stime, etime, target_lonGOFS[0], pl[1])
-                GOFS_targetvar = GOFS_targetvar.sel(depth=slice(0, md))
+                GOFS_targetvar = mdata['GOFS'][minfo['GOFS'][pv]].isel(point=i).sel(depth=slice(0, md))
                 ax.plot(GOFS_targetvar.values, GOFS_targetvar.depth.values, lw=3, c=minfo['GOFS']['color'], label='GOFS')
 
                 # get RTOFS data
                 print('\nPlotting RTOFS')
-                RTOFS_targetvar = rtofs.return_point(minfo['RTOFS'][pv], stime, etime, pl[0], pl[1], 'RTOFS')
-                RTOFS_targetvar = RTOFS_targetvar.sel(Depth=slice(0, md))
+                RTOFS_targetvar = mdata['RTOFS'][minfo['RTOFS'][pv]].isel(point=i).sel(Depth=slice(0, md))
                 ax.plot(RTOFS_targetvar.values, RTOFS_targetvar.Depth.values, lw=3, c=minfo['RTOFS']['color'],
                         label='RTOFS')
 
                 # get RTOFS-DA data
                 print('\nPlotting RTOFS-DA')
-                RTOFSDA_targetvar = rtofs.return_point(minfo['RTOFSDA'][pv], stime, etime, pl[0], pl[1], 'RTOFSDA')
-                RTOFSDA_targetvar = RTOFSDA_targetvar.sel(Depth=slice(0, md))
+                RTOFSDA_targetvar = mdata['RTOFSDA'][minfo['RTOFSDA'][pv]].isel(point=i).sel(Depth=slice(0, md))
                 ax.plot(RTOFSDA_targetvar.values, RTOFSDA_targetvar.Depth.values, lw=3, c=minfo['RTOFSDA']['color'],
                         label='RTOFSDA')
 
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 Author: Lori Garzio on 3/3/2021
-Last modified: 3/23/2021
+Last modified: 10/17/2026
 """
 
 import os
@@ -38,19 +38,20 @@ def main(stime, etime, stm, sDir, glider_deploy):
     glider_vars = ['time', 'latitude', 'longitude', 'depth', 'conductivity', 'density', 'salinity', 'pressure',
                    'temperature']
     glider_ds = gliders.get_erddap_nc(dac_server, id, glider_vars)
-    gtime0 = stime - dt.timedelta(hours=.5)
-    gtime1 = etime + dt.timedelta(hours=.5)
+    gldata = {v: glider_ds[v].values for v in glider_vars}
 
-    glider_ds = glider_ds.swap_dims({'row': 'time'})
-    glider_tm = pd.to_datetime(glider_ds.time.values)
-    gl_timeidx = np.logical_and(glider_tm > gtime0, glider_tm < gtime1)
+    # split the glider data into profiles and find the profile closest to the model time
+    profiles = gliders.build_profile_index(gldata['time'], gldata['depth'], gldata['latitude'], gldata['longitude'])
+    glprofile = gliders.nearest_profile(profiles, stime)
+    if glprofile is None:
+        print('No glider profiles found for {}'.format(glider_deploy))
+        return
+    gl = gliders.return_profile(gldata, glprofile)
 
-    gltm = np.unique(glider_ds.time.values[gl_timeidx])
-    gllat = np.unique(glider_ds.latitude.values[gl_timeidx])
-    gllon = np.unique(glider_ds.longitude.values[gl_timeidx])
-    gldepth = glider_ds.depth.values[gl_timeidx]
-    #gltemp = glider_ds.temperature.values[gl_timeidx]
-    #glsalt = glider_ds.salinity.values[gl_timeidx]
+    gltm = glprofile['time']
+    gllat = glprofile['lat']
+    gllon = glprofile['lon']
+    gldepth = gl['depth']
 
     for md in max_depth:
         for pv in pltvars:
@@ -59,19 +60,19 @@ def main(stime, etime, stm, sDir, glider_deploy):
             plt.grid()
 
             # get GOFS data
-            target_lonGOFS = gofs.convert_target_gofs_lon(gllon[0])
-            GOFS_targetvar = gofs.return_point(minfo['GOFS'][pv], stime, etime, target_lonGOFS[0], gllat[0])
+            target_lonGOFS = gofs.convert_target_gofs_lon(gllon)
+            GOFS_targetvar = gofs.return_point(minfo['GOFS'][pv], stime, etime, target_lonGOFS[0], gllat)
             GOFS_targetvar = GOFS_targetvar.sel(depth=slice(0, md))
             ax.plot(GOFS_targetvar.values, GOFS_targetvar.depth.values, lw=3, c=minfo['GOFS']['color'], label='GOFS')
 
             # get RTOFS data
-            RTOFS_targetvar = rtofs.return_point(minfo['RTOFS'][pv], stime, etime, gllon[0], gllat[0], 'RTOFS')
+            RTOFS_targetvar = rtofs.return_point(minfo['RTOFS'][pv], stime, etime, gllon, gllat, 'RTOFS')
             RTOFS_targetvar = RTOFS_targetvar.sel(Depth=slice(0, md))
             ax.plot(RTOFS_targetvar.values, RTOFS_targetvar.Depth.values, lw=3, c=minfo['RTOFS']['color'],
                     label='RTOFS')
 
             # get RTOFS-DA data
-            RTOFSDA_targetvar = rtofs.return_point(minfo['RTOFSDA'][pv], stime, etime, gllon[0], gllat[0], 'RTOFSDA')
+            RTOFSDA_targetvar = rtofs.return_point(minfo['RTOFSDA'][pv], stime, etime, gllon, gllat, 'RTOFSDA')
             RTOFSDA_targetvar = RTOFSDA_targetvar.sel(Depth=slice(0, md))
             ax.plot(RTOFSDA_targetvar.values, RTOFSDA_targetvar.Depth.values, lw=3, c=minfo['RTOFSDA']['color'],
                     label='RTOFSDA')
@@ -80,7 +81,7 @@ def main(stime, etime, stm, sDir, glider_deploy):
             gl_varname = minfo['glider'][pv]
             gldepth_idx = gldepth <= md
             gldepth_sel = gldepth[gldepth_idx]
-            glider_data = glider_ds[gl_varname].values[gl_timeidx][gldepth_idx]
+            glider_data = gl[gl_varname][gldepth_idx]
             ax.plot(glider_data, gldepth_sel, lw=3, c=minfo['glider']['color'], label='ng314')
 
             ax.set_xticks(xticks[md][pv])
@@ -88,9 +89,9 @@ def main(stime, etime, stm, sDir, glider_deploy):
             ax.set_ylabel('Depth (m)')
             ax.invert_yaxis()
             ax.legend(fontsize=12)
-            pl = [np.round(gllon[0], 2), np.round(gllat[0], 2)]
+            pl = [np.round(gllon, 2), np.round(gllat, 2)]
 
-            gl_timestr = pd.to_datetime(gltm[0]).strftime('%Y-%m-%d %H:%M')
+            gl_timestr = pd.to_datetime(gltm).strftime('%Y-%m-%d %H:%M')
             ttl = 'Comparison at coordinates: {}\nModels: {} Glider: {}'.format(str(pl),
                                                                                 stime.strftime('%Y-%m-%d %H:%M'),
                                                                                 gl_timestr)
@@ -2,13 +2,12 @@
 # -*- coding: utf-8 -*-
 """
 Written by Lori Garzio on 3/5/2021
-Last modified 3/30/2021
+Last modified 10/17/2026
 """
 
 import os
 import numpy as np
 import datetime as dt
-import xarray as xr
 import matplotlib as mpl
 from matplotlib import pyplot as plt
 from matplotlib.lines import Line2D
@@ -17,9 +16,11 @@ from mpl_toolkits.axes_grid1 import make_axes_locatable
 import cmocean as cmo
 import functions.gliders as gliders
 import functions.common as cf
+import functions.ibtracs as ibtracs
 import functions.plotting as pf
 import functions.gofs as gofs
 import functions.rtofs as rtofs
+import functions.render as render
 plt.rcParams.update({'font.size': 14})
 
 
@@ -70,7 +71,57 @@ def surfacevar_plot(figure, axis, longitude, latitude, data, colormap, colorlabe
     plt.subplots_adjust(right=0.88)
 
 
-def main(stime, etime, region, stm, sDir):
+def plot_track_map(savefile, track_lon, track_lat, targetlon, targetlat, tlon, tlat, cat, ibtime_gom, profile_locs,
+                   glider_tracks, lonvalues, latvalues, data, ttl, vinfo, lims, xticks):
+    fig, ax = plt.subplots(subplot_kw=dict(projection=ccrs.PlateCarree()))
+    # plot entire track
+    ax.plot(track_lon, track_lat, c='dimgray', marker='None', linewidth=2, transform=ccrs.PlateCarree(),
+            label='Full Track')
+
+    # plot part of track for model comparison
+    ax.plot(targetlon, targetlat, c='k', marker='None', linewidth=2, transform=ccrs.PlateCarree(),
+            label='Model Transect')
+
+    # plot IBTrACS data points for storm intensity
+    cmap, hurr_legend = hurricane_intensity_cmap(cat)
+    ax.scatter(tlon, tlat, c=cat, cmap=cmap, marker='o', edgecolor='k', s=40, transform=ccrs.PlateCarree(), zorder=10)
+
+    # plot timestamps
+    for tidx in [0, 7, 15]:
+        ax.plot(tlon[tidx], tlat[tidx], c='k', marker='x', ms=8, linestyle='none', transform=ccrs.PlateCarree(),
+                zorder=11)
+        ax.text(tlon[tidx] + .5, tlat[tidx], ibtime_gom[tidx].strftime('%m%dT%H'),
+                bbox=dict(facecolor='lightgray', alpha=0.6), fontsize=6)
+
+    for pl in profile_locs:
+        ax.plot(pl[0], pl[1], c='w', marker='s', mec='k', ms=8, linestyle='none', transform=ccrs.PlateCarree(),
+                label='Profile Comparison')
+
+    handles, labels = plt.gca().get_legend_handles_labels()  # only show one set of legend labels
+    by_label = dict(zip(labels, handles))
+
+    # add 2 legends
+    first_legend = plt.legend(by_label.values(), by_label.keys(), loc='upper right', fontsize=7)
+    plt.legend(handles=hurr_legend, loc='upper left', fontsize=7)
+    plt.gca().add_artist(first_legend)
+
+    # add glider tracks
+    for glid, gllon, gllat in glider_tracks:
+        ax.plot(gllon, gllat, c='w', marker='None', linewidth=3, transform=ccrs.PlateCarree(), zorder=10)
+        ax.text(np.nanmax(gllon), np.nanmax(gllat), glid.split('-')[0], fontsize=5)
+
+    # add model data to map
+    plt.title(ttl, fontsize=12)
+    surfacevar_plot(fig, ax, lonvalues, latvalues, data, vinfo['cmap'], vinfo['label'], vinfo['lims'],
+                    vinfo.get('colorticks'))
+
+    pf.add_map_features(ax, lims, xlocs=xticks, landcolor='lightgray')
+
+    plt.savefig(savefile, dpi=300)
+    plt.close()
+
+
+def main(stime, etime, region, stm, sDir, workers=None, force=False):
     lims, xticks = cf.define_region_limits(region)
     #pltvars = ['ohc', 'temp', 'salt']
     pltvars = ['ohc']
@@ -102,12 +153,12 @@ def main(stime, etime, region, stm, sDir):
                      'lims': [20, 160], 'savename': 'ohc'}
              }
 
-    # get the IBTrACS dataset
-    # define storm indices in IBTrACS file
-    stm_idx = {'Laura_2020': 276}
+    # get the storm track from the IBTrACS track store (built from the IBTrACS file the first time)
     ib = '/Users/garzio/Documents/rucool/hurricane_glider_project/IBTrACS/IBTrACS.last3years.v04r00.nc'
+    ibstore = ibtracs.return_track_store(ib)
     ibvars = ['time', 'lat', 'lon', 'usa_sshs', 'landfall']
-    ibdata = cf.return_ibtracs_storm(ib, stm_idx[stm], ibvars)
+    stm_name, stm_season = stm.split('_')
+    ibdata = ibtracs.return_storm(ibstore, ibvars, name=stm_name, season=stm_season)
 
     # find the portion of the track for which model comparisons will be made
     # find the lat/lon index where the storm is in the Gulf of Mexico
@@ -139,6 +190,20 @@ def main(stime, etime, region, stm, sDir):
     plt.savefig(savefile, dpi=300)
     plt.close()
 
+    # figures that need to be drawn, checked before any model or glider data are downloaded
+    pending = []
+    for pv in pltvars:
+        for model in minfo.keys():
+            savefile = os.path.join(sDir, '{}_{}_track_{}_{}-glider_comp_loc.png'.format(stm, model,
+                                                                                     vinfo[pv]['savename'],
+                                                                                     stime.strftime('%Y%m%dT%H')))
+            inputs = rtofs.get_files(stime, etime, model) if model in ['RTOFS', 'RTOFSDA'] else []
+            if force or not render.is_current(savefile, inputs):
+                pending.append((pv, model, savefile, inputs))
+    if len(pending) == 0:
+        print('\nAll maps are up to date')
+        return
+
     # find glider datasets
     ioos_server = 'https://data.ioos.us/gliders/erddap'
 
@@ -151,91 +216,40 @@ def main(stime, etime, region, stm, sDir):
                      'longitude>=': lims[0], 'longitude<=': lims[1] - 2}
 
     glvars = ['time', 'latitude', 'longitude']
-
-    for pv in pltvars:
-        for model in minfo.keys():
-            fig, ax = plt.subplots(subplot_kw=dict(projection=ccrs.PlateCarree()))
-            # plot entire track
-            ax.plot(ibdata['lon'], ibdata['lat'], c='dimgray', marker='None', linewidth=2, transform=ccrs.PlateCarree(),
-                    label='Full Track')
-
-            # plot part of track for model comparison
-            ax.plot(targetlon, targetlat, c='k', marker='None', linewidth=2, transform=ccrs.PlateCarree(),
-                    label='Model Transect')
-
-            # plot IBTrACS data points for storm intensity
-            cmap, hurr_legend = hurricane_intensity_cmap(cat)
-            ax.scatter(tlon, tlat, c=cat, cmap=cmap, marker='o', edgecolor='k', s=40, transform=ccrs.PlateCarree(), zorder=10)
-
-            # plot timestamps
-            for tidx in [0, 7, 15]:
-                ax.plot(tlon[tidx], tlat[tidx], c='k', marker='x', ms=8, linestyle='none', transform=ccrs.PlateCarree(),
-                        zorder=11)
-                ax.text(tlon[tidx] + .5, tlat[tidx], ibtime_gom[tidx].strftime('%m%dT%H'),
-                        bbox=dict(facecolor='lightgray', alpha=0.6), fontsize=6)
-
-            for pl in profile_locs:
-                ax.plot(pl[0], pl[1], c='w', marker='s', mec='k', ms=8, linestyle='none', transform=ccrs.PlateCarree(),
-                        label='Profile Comparison')
-
-            handles, labels = plt.gca().get_legend_handles_labels()  # only show one set of legend labels
-            by_label = dict(zip(labels, handles))
-
-            # add 2 legends
-            first_legend = plt.legend(by_label.values(), by_label.keys(), loc='upper right', fontsize=7)
-            plt.legend(handles=hurr_legend, loc='upper left', fontsize=7)
-            plt.gca().add_artist(first_legend)
-
-            # add glider tracks
-            for glid in gliderids:
-                glds = gliders.get_erddap_nc(ioos_server, glid, var_list=glvars, constraints=glconstraints)
-                if glds:
-                    gllon = glds.longitude.values
-                    gllat = glds.latitude.values
-                    ax.plot(gllon, gllat, c='w', marker='None', linewidth=3, transform=ccrs.PlateCarree(), zorder=10)
-                    ax.text(np.nanmax(gllon), np.nanmax(gllat), glid.split('-')[0], fontsize=5)
-
-            # add model data to map
-            print('\nPlotting {} {}'.format(model, pv))
-            if model == 'GOFS':
-                if pv == 'ohc':
-                    #mvar = gofs.return_gridded_ds(minfo[model]['temp'], stime, etime, lims)
-                    #mvar = xr.open_dataarray('/Users/garzio/Documents/rucool/hurricane_glider_project/Laura_2020/GOFS_data/GOFS_mvar_20200823T12.nc')
-                    mvar = xr.open_dataarray('/Users/garzio/Documents/rucool/hurricane_glider_project/Laura_2020/GOFS_data/GOFS_mvar_20200828T12.nc')
-                    ohc = cf.ohc_surface_3d(mvar, minfo[model]['coords'], model)
-                    lonvalues = gofs.convert_gofs_target_lon(ohc.lon.values)
-                    latvalues = ohc.lat.values
-                else:
-                    mvar = gofs.return_surface_variable(minfo[model][pv], stime, etime, lims)
-                    lonvalues = gofs.convert_gofs_target_lon(mvar.lon.values)
-                    latvalues = mvar.lat.values
-            elif model in ['RTOFS', 'RTOFSDA']:
-                if pv == 'ohc':
-                    mvar = rtofs.return_gridded_ds(minfo[model]['temp'], stime, etime, lims, model)
-                    ohc = cf.ohc_surface_3d(mvar, minfo[model]['coords'], model)
-                    lonvalues = ohc.Longitude.values
-                    latvalues = ohc.Latitude.values
-                else:
-                    mvar = rtofs.return_surface_variable(minfo[model][pv], stime, etime, lims, model)
-                    lonvalues = mvar.Longitude.values
-                    latvalues = mvar.Latitude.values
-
-            savefile = os.path.join(sDir, '{}_{}_track_{}_{}-glider_comp_loc.png'.format(stm, model, vinfo[pv]['savename'],
-                                                                         stime.strftime('%Y%m%dT%H')))
-            ttl = '{} {}: {}\nGlider lims: {} to {}'.format(model, vinfo[pv]['name'], stime.strftime('%Y-%m-%d %H:%M'),
-                                                            t0_str, tf_str)
-            plt.title(ttl, fontsize=12)
+    glider_data = gliders.get_erddap_nc_bulk(ioos_server, gliderids, var_list=glvars, constraints=glconstraints)
+    glider_tracks = [(glid, glds.longitude.values, glds.latitude.values) for glid, glds in glider_data.items()
+                     if glds]
+
+    # prepare the data for each map, then draw the maps in parallel
+    jobs = []
+    for pv, model, savefile, inputs in pending:
+        print('\nPreparing {} {}'.format(model, pv))
+        if model == 'GOFS':
+            if pv == 'ohc':
+                mvar = gofs.return_gridded_ds(minfo[model]['temp'], stime, etime, lims)
+                mvar = cf.ohc_surface_3d(mvar, minfo[model]['coords'], model)
+            else:
+                mvar = gofs.return_surface_variable(minfo[model][pv], stime, etime, lims)
+            lonvalues = gofs.convert_gofs_target_lon(mvar.lon.values)
+            latvalues = mvar.lat.values
+        elif model in ['RTOFS', 'RTOFSDA']:
             if pv == 'ohc':
-                surfacevar_plot(fig, ax, lonvalues, latvalues, ohc.values, vinfo[pv]['cmap'], vinfo[pv]['label'],
-                                vinfo[pv]['lims'])
+                mvar = rtofs.return_gridded_ds(minfo[model]['temp'], stime, etime, lims, model)
+                mvar = cf.ohc_surface_3d(mvar, minfo[model]['coords'], model)
             else:
-                surfacevar_plot(fig, ax, lonvalues, latvalues, mvar.values, vinfo[pv]['cmap'], vinfo[pv]['label'],
-                                vinfo[pv]['lims'], vinfo[pv]['colorticks'])
+                mvar = rtofs.return_surface_variable(minfo[model][pv], stime, etime, lims, model)
+            lonvalues = mvar.Longitude.values
+            latvalues = mvar.Latitude.values
 
-            pf.add_map_features(ax, lims, xlocs=xticks, landcolor='lightgray')
+        ttl = '{} {}: {}\nGlider lims: {} to {}'.format(model, vinfo[pv]['name'], stime.strftime('%Y-%m-%d %H:%M'),
+                                                        t0_str, tf_str)
+        jobs.append(render.figure_job(plot_track_map, savefile, inputs, track_lon=ibdata['lon'],
+                                      track_lat=ibdata['lat'], targetlon=targetlon, targetlat=targetlat, tlon=tlon,
+                                      tlat=tlat, cat=cat, ibtime_gom=ibtime_gom, profile_locs=profile_locs,
+                                      glider_tracks=glider_tracks, lonvalues=lonvalues, latvalues=latvalues,
+                                      data=mvar.values, ttl=ttl, vinfo=vinfo[pv], lims=lims, xticks=xticks))
 
-            plt.savefig(savefile, dpi=300)
-            plt.close()
+    render.run_jobs(jobs, workers, force)
 
 
 if __name__ == '__main__':
@@ -246,4 +260,5 @@ if __name__ == '__main__':
     region = 'GoMex'
     storm_name = 'Laura_2020'
     save_dir = os.path.join('/Users/garzio/Documents/rucool/hurricane_glider_project', storm_name)
-    main(start_time, end_time, region, storm_name, save_dir)
+    nworkers = 4  # number of processes used to draw the maps
+    main(start_time, end_time, region, storm_name, save_dir, nworkers)
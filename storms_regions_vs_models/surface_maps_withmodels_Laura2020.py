@@ -2,19 +2,19 @@
 # -*- coding: utf-8 -*-
 """
 Written by Lori Garzio on 3/5/2021
-Last modified 4/15/2021
+Last modified 10/17/2026
 """
 
 import os
 import numpy as np
 import datetime as dt
-import xarray as xr
 from matplotlib import pyplot as plt
 import cartopy.crs as ccrs
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 import cmocean as cmo
 import functions.gliders as gliders
 import functions.common as cf
+import functions.ibtracs as ibtracs
 import functions.plotting as pf
 import functions.gofs as gofs
 import functions.rtofs as rtofs
@@ -80,12 +80,12 @@ def main(stime, etime, region, stm, sDir, profile_loc_models=None, profile_loc_g
                      'lims': [20, 160], 'savename': 'ohc'}
              }
 
-    # get the IBTrACS dataset
-    # define storm indices in IBTrACS file
-    stm_idx = {'Laura_2020': 276}
+    # get the storm track from the IBTrACS track store (built from the IBTrACS file the first time)
     ib = '/Users/garzio/Documents/rucool/hurricane_glider_project/IBTrACS/IBTrACS.last3years.v04r00.nc'
+    ibstore = ibtracs.return_track_store(ib)
     ibvars = ['time', 'lat', 'lon', 'usa_sshs', 'landfall']
-    ibdata = cf.return_ibtracs_storm(ib, stm_idx[stm], ibvars)
+    stm_name, stm_season = stm.split('_')
+    ibdata = ibtracs.return_storm(ibstore, ibvars, name=stm_name, season=stm_season)
 
     # find the portion of the track for which model comparisons will be made
     # find the lat/lon index where the storm is in the Gulf of Mexico
@@ -138,9 +138,7 @@ def main(stime, etime, region, stm, sDir, profile_loc_models=None, profile_loc_g
             print('\nPlotting {} {}'.format(model, pv))
             if model == 'GOFS':
                 if pv == 'ohc':
-                    #mvar = gofs.return_gridded_ds(minfo[model]['temp'], stime, etime, lims)
-                    mvar = xr.open_dataarray('/Users/garzio/Documents/rucool/hurricane_glider_project/Laura_2020/GOFS_data/GOFS_mvar_20200823T12.nc')
-                    #mvar = xr.open_dataarray('/Users/garzio/Documents/rucool/hurricane_glider_project/Laura_2020/GOFS_data/GOFS_mvar_20200828T12.nc')
+                    mvar = gofs.return_gridded_ds(minfo[model]['temp'], stime, etime, lims)
                     ohc = cf.ohc_surface_3d(mvar, minfo[model]['coords'], model)
                     lonvalues = gofs.convert_gofs_target_lon(ohc.lon.values)
                     latvalues = ohc.lat.values